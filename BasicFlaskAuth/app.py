@@ -1,124 +1,42 @@
-from flask import Flask, request, abort
-import json
-from functools import wraps
-from jose import jwt
-from urllib.request import urlopen
+import os
+import sys
+from flask import Flask, jsonify
 
+# the auth code shared with the coffee shop lives in jwt_auth/,
+# at the root of the repository
+sys.path.insert(0, os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.pardir)))
 
-app = Flask(__name__)
-
-AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
-ALGORITHMS = ['RS256']
-API_AUDIENCE = @TODO_REPLACE_WITH_YOUR_API_AUDIENCE
-
-
-class AuthError(Exception):
-    def __init__(self, error, status_code):
-        self.error = error
-        self.status_code = status_code
-
-
-def get_token_auth_header():
-    """Obtains the Access Token from the Authorization Header
-    """
-    auth = request.headers.get('Authorization', None)
-    if not auth:
-        raise AuthError({
-            'code': 'authorization_header_missing',
-            'description': 'Authorization header is expected.'
-        }, 401)
-
-    parts = auth.split()
-    if parts[0].lower() != 'bearer':
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization header must start with "Bearer".'
-        }, 401)
+from jwt_auth import Auth, AuthError, JWKSKeyProvider  # noqa: E402
 
-    elif len(parts) == 1:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Token not found.'
-        }, 401)
 
-    elif len(parts) > 2:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization header must be bearer token.'
-        }, 401)
-
-    token = parts[1]
-    return token
-
-
-def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
-    if 'kid' not in unverified_header:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization malformed.'
-        }, 401)
-
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
-    if rsa_key:
-        try:
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
-
-            return payload
+app = Flask(__name__)
 
-        except jwt.ExpiredSignatureError:
-            raise AuthError({
-                'code': 'token_expired',
-                'description': 'Token expired.'
-            }, 401)
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'TODO_REPLACE_WITH_YOUR_DOMAIN')
+ALGORITHMS = ['RS256']
+API_AUDIENCE = os.environ.get(
+    'API_AUDIENCE', 'TODO_REPLACE_WITH_YOUR_API_AUDIENCE')
+JWKS_URL = os.environ.get(
+    'JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+# another issuer, e.g. a local one (see jwt_auth/issuer.py)
+AUTH_ISSUER = os.environ.get('AUTH_ISSUER', 'https://' + AUTH0_DOMAIN + '/')
 
-        except jwt.JWTClaimsError:
-            raise AuthError({
-                'code': 'invalid_claims',
-                'description': 'Incorrect claims. Please, check the audience and issuer.'
-            }, 401)
-        except Exception:
-            raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to parse authentication token.'
-            }, 400)
-    raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to find the appropriate key.'
-            }, 400)
+auth = Auth(JWKSKeyProvider(JWKS_URL, ALGORITHMS[0]), API_AUDIENCE,
+            AUTH_ISSUER)
+requires_auth = auth.requires_auth
 
 
-def requires_auth(f):
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        token = get_token_auth_header()
-        try:
-            payload = verify_decode_jwt(token)
-        except:
-            abort(401)
-        return f(payload, *args, **kwargs)
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify({
+        'success': False,
+        'error': error.status_code,
+        'message': error.error
+    }), error.status_code
 
-    return wrapper
 
 @app.route('/headers')
-@requires_auth
+@requires_auth()
 def headers(payload):
     print(payload)
-    return 'Access Granted'
\ No newline at end of file
+    return 'Access Granted'
@@ -0,0 +1,61 @@
+import json
+
+from flask import Response, request, stream_with_context
+
+NDJSON = 'application/x-ndjson'
+# items serialized per chunk written to the response
+CHUNK_SIZE = 100
+# rows fetched per round trip from the database while streaming
+STREAM_BATCH_SIZE = 500
+
+
+# opt-in streaming of large collections: instead of formatting the whole
+# collection and serializing it with jsonify, the items are serialized
+# while the query is iterated and written out in chunks, so the memory used
+# by a response doesn't depend on the size of the collection.
+# `Accept: application/x-ndjson` streams one JSON item per line,
+# `?stream=1` streams the usual JSON object, with the same keys.
+# used by the coffee shop, whose src package adds the root of the repository
+# to sys.path for jwt_auth
+
+
+def stream_format():
+    # returns 'ndjson' or 'json' when the request asks for a streamed response
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON])
+    if best == NDJSON:
+        return 'ndjson'
+    if request.args.get('stream'):
+        return 'json'
+    return None
+
+
+def chunks(lines, size=CHUNK_SIZE):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_json(format, key, items, **fields):
+    # streams `items` as NDJSON, or as the JSON object
+    # {**fields, key: [items]} when format is 'json'
+    if format == 'ndjson':
+        lines = (json.dumps(item) + '\n' for item in items)
+        return Response(stream_with_context(chunks(lines)), mimetype=NDJSON)
+
+    def generate():
+        yield '{' + ''.join('{}: {}, '.format(json.dumps(name), json.dumps(value))
+                            for name, value in fields.items())
+        yield json.dumps(key) + ': ['
+        separator = ''
+        for item in items:
+            yield separator + json.dumps(item)
+            separator = ', '
+        yield ']}'
+
+    return Response(stream_with_context(chunks(generate())),
+                    mimetype='application/json')
@@ -0,0 +1,12 @@
+'''
+jwt_auth
+the verification of the JWTs of the Flask APIs of this repository
+(BasicFlaskAuth and the coffee shop), see README.md
+'''
+
+from .errors import AuthError
+from .core import Auth, get_token_auth_header, check_permissions
+from .keys import JWKSKeyProvider, PEMKeyProvider, SecretKeyProvider
+from .tokens import TokenCache
+from .permissions import (
+    Grants, Permission, any_of, all_of, compile_permission)
@@ -0,0 +1,111 @@
+'''
+Verification benchmark
+    times the verification of one token, with a local key set instead of
+    the network, for
+        per-request JWKS: the key set fetched and scanned for every token,
+            as BasicFlaskAuth and the coffee shop used to do
+        cached JWKS: the keys cached by kid by JWKSKeyProvider
+        PEM key: one key constructed once by PEMKeyProvider
+        HS256: a shared secret, SecretKeyProvider
+        token cache: a token sent again, found in TokenCache
+USAGE
+    python -m jwt_auth.bench [--iterations 2000]
+    (from the root of the repository)
+'''
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from urllib.request import urlopen
+
+from jose import jwt
+
+from .core import Auth
+from .issuer import LocalIssuer, generate_private_key
+from .keys import JWKSKeyProvider, PEMKeyProvider, SecretKeyProvider
+from .tokens import TokenCache
+
+AUDIENCE = 'bench-api'
+ISSUER = 'https://bench.local/'
+PERMISSIONS = ['get:drinks-detail', 'post:drinks', 'patch:drinks']
+
+
+def claims():
+    return {
+        'sub': 'bench',
+        'aud': AUDIENCE,
+        'iss': ISSUER,
+        'exp': int(time.time()) + 3600,
+        'permissions': PERMISSIONS
+    }
+
+
+'''
+per_request_jwks(url)
+    the verification as it was before the keys were cached
+'''
+
+
+def per_request_jwks(url):
+    def verify(token):
+        jwks = json.loads(urlopen(url).read())
+        unverified_header = jwt.get_unverified_header(token)
+        rsa_key = {}
+        for key in jwks['keys']:
+            if key['kid'] == unverified_header['kid']:
+                rsa_key = {name: key[name] for name in ('kty', 'kid', 'use', 'n', 'e')}
+        return jwt.decode(token, rsa_key, algorithms=['RS256'],
+                          audience=AUDIENCE, issuer=ISSUER)
+    return verify
+
+
+def timeit(verify, token, iterations):
+    verify(token)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        verify(token)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JWT verification benchmark')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    issuer = LocalIssuer(generate_private_key(), issuer=ISSUER)
+    public_pem = issuer.public_key.to_pem().decode()
+    rsa_token = issuer.mint(AUDIENCE, PERMISSIONS)
+    secret = os.urandom(32).hex()
+    hs_token = jwt.encode(claims(), secret, algorithm='HS256')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'jwks.json')
+        with open(path, 'w') as file:
+            json.dump(issuer.jwks(), file)
+        url = 'file://' + path
+
+        jwks_keys = JWKSKeyProvider(url, background=False)
+        cases = [
+            ('per-request JWKS', per_request_jwks(url), rsa_token),
+            ('cached JWKS', Auth(jwks_keys, AUDIENCE, ISSUER).verify_token,
+             rsa_token),
+            ('PEM key', Auth(PEMKeyProvider(public_pem), AUDIENCE,
+                             ISSUER).verify_token, rsa_token),
+            ('HS256', Auth(SecretKeyProvider(secret), AUDIENCE,
+                           ISSUER).verify_token, hs_token),
+            ('token cache', Auth(jwks_keys, AUDIENCE, ISSUER,
+                                 token_cache=TokenCache()).verify_token,
+             rsa_token)
+        ]
+
+        print('{:<18} {:>12} {:>12}'.format('', 'us/token', 'tokens/s'))
+        for name, verify, token in cases:
+            seconds = timeit(verify, token, args.iterations)
+            print('{:<18} {:>12.1f} {:>12.0f}'.format(
+                name, seconds * 1e6, 1 / seconds))
+
+
+if __name__ == '__main__':
+    main()
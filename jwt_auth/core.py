@@ -0,0 +1,191 @@
+from functools import wraps
+
+from flask import request
+from jose import jwt
+
+from .errors import AuthError
+from .permissions import Grants, compile_permission
+
+
+'''
+get_token_auth_header()
+    returns the bearer token of the Authorization header of the request
+'''
+
+
+def get_token_auth_header():
+    auth = request.headers.get('Authorization', None)
+
+    if not auth:
+        raise AuthError({
+            'code': 'missing_auth_header',
+            'description': 'Expected Authorization Header'
+        }, 401)
+
+    split_header = auth.split()
+
+    if split_header[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'header_invalid',
+            'description': 'Expected Authorization Header to start with "Bearer"'
+        }, 401)
+
+    elif len(split_header) == 1:
+        raise AuthError({
+            'code': 'header_invalid',
+            'description': 'Missing Token'
+        }, 401)
+
+    elif len(split_header) > 2:
+        raise AuthError({
+            'code': 'header_invalid',
+            'description': 'Expected Authorization Header to be Bearer Token'
+        }, 401)
+
+    return split_header[1]
+
+
+'''
+check_permissions(permission, payload, grants=None)
+    `permission` is a permission expression, see permissions.py, preferably
+    compiled, and `grants` the Grants of the payload, built if not given
+'''
+
+
+def check_permissions(permission, payload, grants=None):
+    if 'permissions' not in payload:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Permissions are not included in payload'
+        }, 400)
+
+    if grants is None:
+        grants = Grants(payload['permissions'])
+
+    if not compile_permission(permission).allows(grants):
+        raise AuthError({
+            'code': 'unauthorized',
+            'description': 'The user is not allowed to do this operation'
+        }, 401)
+
+    return True
+
+
+'''
+Auth
+the verification of the tokens of an API
+    `keys` is a key provider (see keys.py), the tokens are checked against
+    `audience` and `issuer`, and the verified ones are cached in
+    `token_cache` (a TokenCache) when given
+EXAMPLE
+    auth = Auth(JWKSKeyProvider(url), 'my-api', 'https://example.auth0.com/')
+
+    @app.route('/drinks-detail')
+    @auth.requires_auth('get:drinks-detail')
+    def get_drinks_detail(payload):
+'''
+
+
+class Auth:
+    def __init__(self, keys, audience, issuer, token_cache=None):
+        self.keys = keys
+        self.audience = audience
+        self.issuer = issuer
+        self.token_cache = token_cache
+
+    '''
+    verify_token(token)
+        returns the payload of the token, and the Grants of its permissions
+        (None when it has none), built once per token
+    '''
+    def verify_token(self, token):
+        # a token verified before, that didn't expire since
+        if self.token_cache is not None:
+            verified = self.token_cache.get(token)
+            if verified is not None:
+                return verified
+
+        try:
+            unverified_header = jwt.get_unverified_header(token)
+        except jwt.JWTError:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+        if self.keys.requires_kid and 'kid' not in unverified_header:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Authorization malformed.'
+            }, 401)
+
+        try:
+            key = self.keys.get_key(unverified_header.get('kid'))
+        except Exception:
+            raise AuthError({
+                'code': 'jwks_unavailable',
+                'description': 'Unable to fetch the signing keys.'
+            }, 503)
+
+        if key is None:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to find the appropriate key.'
+            }, 400)
+
+        try:
+            payload = jwt.decode(
+                token,
+                key,
+                algorithms=self.keys.algorithms,
+                audience=self.audience,
+                issuer=self.issuer
+            )
+
+        except jwt.ExpiredSignatureError:
+            raise AuthError({
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+
+        except jwt.JWTClaimsError:
+            raise AuthError({
+                'code': 'invalid_claims',
+                'description': 'Incorrect claims. Please, check the audience and issuer.'
+            }, 401)
+        except Exception:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+        grants = None
+        if 'permissions' in payload:
+            grants = Grants(payload['permissions'])
+        if self.token_cache is not None:
+            self.token_cache.set(token, (payload, grants), payload.get('exp'))
+        return payload, grants
+
+    def verify_decode_jwt(self, token):
+        return self.verify_token(token)[0]
+
+    '''
+    requires_auth(permission=None)
+        decorates an endpoint, which is called with the payload of the token,
+        with None the token is only verified, its permissions aren't checked
+    '''
+    def requires_auth(self, permission=None):
+        # the permission expression is compiled once, when the endpoint is decorated
+        required = None if permission is None else compile_permission(permission)
+
+        def requires_auth_decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                token = get_token_auth_header()
+                payload, grants = self.verify_token(token)
+                if required is not None:
+                    check_permissions(required, payload, grants)
+                return f(payload, *args, **kwargs)
+
+            return wrapper
+        return requires_auth_decorator
@@ -0,0 +1,179 @@
+'''
+Local issuer
+    an RSA keypair standing in for Auth0, to verify tokens without the
+    network, e.g. to load test the endpoints that require auth.
+    the APIs verify its tokens when JWKS_URL points to its key set and
+    AUTH_ISSUER is its issuer (LOCAL_ISSUER by default)
+USAGE
+    (from the root of the repository)
+    python -m jwt_auth.issuer keygen --out local-issuer.pem
+    python -m jwt_auth.issuer jwks --key local-issuer.pem --out jwks.json
+    python -m jwt_auth.issuer jwks --key local-issuer.pem --serve --port 8765
+    python -m jwt_auth.issuer token --key local-issuer.pem \
+        --audience coffee-shop-api --permission get:drinks-detail
+'''
+
+import argparse
+import base64
+import hashlib
+import http.server
+import json
+import time
+
+from jose import jwk, jwt
+
+LOCAL_ISSUER = 'https://local-issuer/'
+JWKS_PATH = '/.well-known/jwks.json'
+
+
+'''
+generate_private_key(bits=2048)
+    returns the PEM of a new RSA private key
+'''
+
+
+def generate_private_key(bits=2048):
+    try:
+        # pycryptodome, from the requirements of the apps
+        from Crypto.PublicKey import RSA
+        return RSA.generate(bits).export_key('PEM').decode()
+    except ImportError:
+        # a dependency of python-jose
+        import rsa
+        return rsa.newkeys(bits)[1].save_pkcs1().decode()
+
+
+'''
+LocalIssuer
+mints the tokens of a local issuer, and publishes its key set
+    the kid of the key is derived from the public key, so the tokens
+    minted with the same private key always have the same kid
+EXAMPLE
+    issuer = LocalIssuer(generate_private_key())
+    token = issuer.mint('coffee-shop-api', ['get:drinks-detail'])
+'''
+
+
+class LocalIssuer:
+    def __init__(self, private_pem, issuer=LOCAL_ISSUER, algorithm='RS256'):
+        self.private_pem = private_pem
+        self.issuer = issuer
+        self.algorithm = algorithm
+        self.public_key = jwk.construct(private_pem, algorithm).public_key()
+        self.kid = base64.urlsafe_b64encode(hashlib.sha256(
+            self.public_key.to_pem()).digest()[:12]).decode()
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as file:
+            return cls(file.read(), **kwargs)
+
+    def jwks(self):
+        key = self.public_key.to_dict()
+        key = {name: value.decode() if isinstance(value, bytes) else value
+               for name, value in key.items()}
+        key.update(kid=self.kid, use='sig', alg=self.algorithm)
+        return {'keys': [key]}
+
+    def mint(self, audience, permissions=(), subject='local-user',
+             expires_in=3600):
+        now = int(time.time())
+        return jwt.encode({
+            'iss': self.issuer,
+            'sub': subject,
+            'aud': audience,
+            'iat': now,
+            'exp': now + expires_in,
+            'permissions': list(permissions)
+        }, self.private_pem, algorithm=self.algorithm,
+            headers={'kid': self.kid})
+
+
+'''
+serve_jwks(issuer, port)
+    serves the key set of the issuer at http://localhost:<port>/.well-known/jwks.json
+    until interrupted
+'''
+
+
+def serve_jwks(issuer, host='127.0.0.1', port=8765):
+    body = json.dumps(issuer.jwks()).encode()
+
+    class JWKSHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != JWKS_PATH:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer((host, port), JWKSHandler)
+    print('JWKS_URL=http://{}:{}{}'.format(host, port, JWKS_PATH))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def keygen(args):
+    with open(args.out, 'w') as file:
+        file.write(generate_private_key(args.bits))
+    print('kid', LocalIssuer.from_file(args.out).kid)
+
+
+def write_jwks(args):
+    issuer = LocalIssuer.from_file(args.key)
+    if args.serve:
+        serve_jwks(issuer, args.host, args.port)
+    elif args.out:
+        with open(args.out, 'w') as file:
+            json.dump(issuer.jwks(), file)
+    else:
+        print(json.dumps(issuer.jwks(), indent=2))
+
+
+def token(args):
+    issuer = LocalIssuer.from_file(args.key, issuer=args.issuer)
+    print(issuer.mint(args.audience, args.permission, args.subject,
+                      args.expires_in))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='JWT local issuer')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('keygen', help='generate an RSA private key')
+    command.add_argument('--out', default='local-issuer.pem')
+    command.add_argument('--bits', type=int, default=2048)
+    command.set_defaults(run=keygen)
+
+    command = commands.add_parser('jwks', help='write or serve the key set')
+    command.add_argument('--key', default='local-issuer.pem')
+    command.add_argument('--out', help='file to write, printed if not given')
+    command.add_argument('--serve', action='store_true')
+    command.add_argument('--host', default='127.0.0.1')
+    command.add_argument('--port', type=int, default=8765)
+    command.set_defaults(run=write_jwks)
+
+    command = commands.add_parser('token', help='mint a token')
+    command.add_argument('--key', default='local-issuer.pem')
+    command.add_argument('--audience', required=True)
+    command.add_argument('--permission', action='append', default=[],
+                         help='a granted permission, can be repeated')
+    command.add_argument('--subject', default='local-user')
+    command.add_argument('--issuer', default=LOCAL_ISSUER)
+    command.add_argument('--expires-in', type=int, default=3600,
+                         help='seconds')
+    command.set_defaults(run=token)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
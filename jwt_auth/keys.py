@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+from jose import jwk
+
+
+'''
+Key providers
+    a key provider returns the key object that verifies a token, given the
+    kid of its header, from get_key(kid), and tells which `algorithms` its
+    keys verify and whether tokens need a kid (`requires_kid`).
+    the key objects are constructed once and reused for every token
+'''
+
+
+'''
+JWKSKeyProvider
+a cache of the signing keys published at a JWKS url
+    the keys are indexed by their kid, and constructed into key objects
+    once per fetch, so verifying a token is a dict lookup, not an http
+    round-trip and a scan of the key set
+    the key set is fetched again in the background every `ttl` seconds,
+    and when a token is signed with an unknown kid (the keys were rotated),
+    at most once every `min_refetch_interval` seconds, and by one thread at
+    a time while the others wait for its result
+    the url can be an https:// url, a file:// url (e.g. a local JWKS file
+    for tests) or an http:// url of a stub server
+EXAMPLE
+    keys = JWKSKeyProvider('https://example.auth0.com/.well-known/jwks.json')
+    key = keys.get_key(jwt.get_unverified_header(token)['kid'])
+'''
+
+
+class JWKSKeyProvider:
+    requires_kid = True
+
+    def __init__(self, url, algorithm='RS256', ttl=600,
+                 min_refetch_interval=30, timeout=5, background=True):
+        self.url = url
+        self.algorithm = algorithm
+        self.algorithms = [algorithm]
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self.background = background
+        self.keys = None
+        self.fetched_at = 0
+        # incremented on every fetch, tells the threads waiting for
+        # the fetch lock whether the keys were fetched in the meantime
+        self.generation = 0
+        self.fetch_lock = threading.Lock()
+        self.refresher = None
+        self.stopped = threading.Event()
+
+    '''
+    read_jwks()
+        returns the key set published at the url
+    '''
+    def read_jwks(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    '''
+    fetch()
+        fetches the key set, and replaces the cached keys
+        raises the URLError or ValueError of a failed fetch
+    '''
+    def fetch(self):
+        jwks = self.read_jwks()
+
+        keys = {}
+        for key in jwks['keys']:
+            if key.get('use', 'sig') != 'sig' or 'kid' not in key:
+                continue
+            keys[key['kid']] = jwk.construct(key, key.get('alg', self.algorithm))
+
+        self.keys = keys
+        self.fetched_at = time.time()
+        self.generation += 1
+
+    '''
+    refetch(generation)
+        fetches the key set, unless another thread did since `generation`
+        or the last fetch is less than `min_refetch_interval` seconds old
+    '''
+    def refetch(self, generation):
+        with self.fetch_lock:
+            if self.generation != generation:
+                return
+            if self.keys is not None and \
+                    time.time() - self.fetched_at < self.min_refetch_interval:
+                return
+            self.fetch()
+
+    '''
+    get_key(kid)
+        returns the key object of `kid`, or None when the key set has no such key
+    '''
+    def get_key(self, kid):
+        generation = self.generation
+        if self.keys is None:
+            self.refetch(generation)
+            self.start()
+        elif kid not in self.keys:
+            self.refetch(generation)
+        elif self.refresher is None and time.time() - self.fetched_at > self.ttl:
+            # without a background refresh, the keys expire
+            self.refetch(generation)
+
+        return (self.keys or {}).get(kid)
+
+    '''
+    start()
+        starts refreshing the keys in the background every `ttl` seconds
+    '''
+    def start(self):
+        if not self.background or self.refresher is not None:
+            return
+        self.refresher = threading.Thread(target=self.refresh_forever, daemon=True)
+        self.refresher.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def refresh_forever(self):
+        while not self.stopped.wait(self.ttl):
+            try:
+                with self.fetch_lock:
+                    self.fetch()
+            except Exception:
+                # the cached keys are served until a fetch succeeds,
+                # unknown kids still trigger a refetch
+                pass
+
+
+'''
+PEMKeyProvider
+the public key of a local issuer, read from a PEM string or file
+    when `kid` is given, only the tokens with that kid are verified
+EXAMPLE
+    keys = PEMKeyProvider(path='public.pem')
+'''
+
+
+class PEMKeyProvider:
+    requires_kid = False
+
+    def __init__(self, pem=None, path=None, kid=None, algorithm='RS256'):
+        if pem is None:
+            with open(path) as file:
+                pem = file.read()
+        self.kid = kid
+        self.algorithms = [algorithm]
+        self.key = jwk.construct(pem, algorithm)
+
+    def get_key(self, kid):
+        if self.kid is not None and kid != self.kid:
+            return None
+        return self.key
+
+
+'''
+SecretKeyProvider
+a shared secret, for tokens signed with HS256, e.g. in tests
+    never use it with tokens issued by a third party
+'''
+
+
+class SecretKeyProvider:
+    requires_kid = False
+
+    def __init__(self, secret, algorithm='HS256'):
+        self.algorithms = [algorithm]
+        self.key = jwk.construct(secret, algorithm)
+
+    def get_key(self, kid):
+        return self.key
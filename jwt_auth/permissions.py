@@ -0,0 +1,109 @@
+'''
+Permission expressions
+    the permissions required by requires_auth are compiled once, when the
+    endpoint is decorated, and checked against the Grants of a verified
+    token, built once per token, with set lookups only.
+    an expression is
+        a permission, 'action:resource', either part can be '*':
+            'get:drinks-detail', '*:drinks' (any action on drinks),
+            'delete:*' (delete anything)
+        any_of(expression, ...), satisfied by any of the expressions
+        all_of(expression, ...), or a list of expressions,
+            satisfied by all of them
+    a granted permission can use '*' the same way, e.g. a token granted
+    '*:drinks' satisfies 'patch:drinks'
+EXAMPLE
+    @requires_auth(any_of('patch:drinks', 'post:drinks'))
+'''
+
+WILDCARD = '*'
+
+
+'''
+Grants
+the permissions granted to a token, indexed for the checks
+'''
+
+
+class Grants:
+    __slots__ = ('permissions', 'actions', 'resources')
+
+    def __init__(self, permissions):
+        self.permissions = frozenset(permissions)
+        pairs = [permission.split(':', 1) for permission in self.permissions
+                 if ':' in permission]
+        self.actions = frozenset(action for action, resource in pairs)
+        self.resources = frozenset(resource for action, resource in pairs)
+
+
+class Permission:
+    def __init__(self, expression):
+        if not isinstance(expression, str):
+            raise ValueError('invalid permission: {!r}'.format(expression))
+        self.expression = expression
+        self.action, _, self.resource = expression.partition(':')
+        if ':' not in expression:
+            self.action = self.resource = None
+        # the granted permissions that satisfy an exact permission
+        self.granting = frozenset([
+            expression,
+            '{}:{}'.format(WILDCARD, self.resource),
+            '{}:{}'.format(self.action, WILDCARD),
+            '{}:{}'.format(WILDCARD, WILDCARD)
+        ]) if self.action is not None else frozenset([expression])
+
+    def allows(self, grants):
+        if self.action == WILDCARD and self.resource == WILDCARD:
+            return bool(grants.actions)
+        if self.action == WILDCARD:
+            return self.resource in grants.resources or WILDCARD in grants.resources
+        if self.resource == WILDCARD:
+            return self.action in grants.actions or WILDCARD in grants.actions
+        return not self.granting.isdisjoint(grants.permissions)
+
+    def __repr__(self):
+        return repr(self.expression)
+
+
+class AnyOf:
+    def __init__(self, expressions):
+        self.expressions = [compile_permission(expression) for expression in expressions]
+
+    def allows(self, grants):
+        return any(expression.allows(grants) for expression in self.expressions)
+
+    def __repr__(self):
+        return 'any_of({})'.format(', '.join(map(repr, self.expressions)))
+
+
+class AllOf:
+    def __init__(self, expressions):
+        self.expressions = [compile_permission(expression) for expression in expressions]
+
+    def allows(self, grants):
+        return all(expression.allows(grants) for expression in self.expressions)
+
+    def __repr__(self):
+        return 'all_of({})'.format(', '.join(map(repr, self.expressions)))
+
+
+def any_of(*expressions):
+    return AnyOf(expressions)
+
+
+def all_of(*expressions):
+    return AllOf(expressions)
+
+
+'''
+compile_permission(expression)
+    returns the compiled expression, raises ValueError when it's invalid
+'''
+
+
+def compile_permission(expression):
+    if isinstance(expression, (Permission, AnyOf, AllOf)):
+        return expression
+    if isinstance(expression, (list, tuple, set, frozenset)):
+        return AllOf(expression)
+    return Permission(expression)
@@ -0,0 +1,316 @@
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+
+from jose import jwt
+
+from jwt_auth import (
+    Auth, AuthError, Grants, JWKSKeyProvider, Permission, TokenCache,
+    all_of, any_of, check_permissions, compile_permission)
+from jwt_auth.issuer import LocalIssuer, generate_private_key
+
+AUDIENCE = 'coffee-shop-api'
+
+
+class PermissionTestCase(unittest.TestCase):
+    """Permission expressions against exact and wildcard grants"""
+
+    def assertAllows(self, expression, permissions):
+        self.assertTrue(compile_permission(expression).allows(Grants(permissions)),
+                        '{!r} should allow {}'.format(expression, permissions))
+
+    def assertDenies(self, expression, permissions):
+        self.assertFalse(compile_permission(expression).allows(Grants(permissions)),
+                         '{!r} should deny {}'.format(expression, permissions))
+
+    def test_exact_permission(self):
+        self.assertAllows('patch:drinks', ['get:drinks-detail', 'patch:drinks'])
+        self.assertDenies('patch:drinks', ['get:drinks-detail', 'post:drinks'])
+        self.assertDenies('patch:drinks', [])
+
+    def test_exact_permission_wildcard_grants(self):
+        for granted in ('*:drinks', 'patch:*', '*:*'):
+            self.assertAllows('patch:drinks', [granted])
+        self.assertDenies('patch:drinks', ['*:drinks-detail'])
+        self.assertDenies('patch:drinks', ['delete:*'])
+
+    def test_any_action_on_resource(self):
+        self.assertAllows('*:drinks', ['post:drinks'])
+        self.assertAllows('*:drinks', ['*:drinks'])
+        self.assertAllows('*:drinks', ['patch:*'])
+        self.assertDenies('*:drinks', ['get:drinks-detail'])
+
+    def test_action_on_any_resource(self):
+        self.assertAllows('patch:*', ['patch:drinks'])
+        self.assertAllows('patch:*', ['*:drinks'])
+        self.assertDenies('patch:*', ['get:drinks', 'post:drinks'])
+
+    def test_any_permission(self):
+        self.assertAllows('*:*', ['get:drinks-detail'])
+        self.assertDenies('*:*', [])
+        self.assertDenies('*:*', ['not-a-permission'])
+
+    def test_all_of_list(self):
+        required = ['get:drinks-detail', 'post:drinks']
+        self.assertAllows(required, ['get:drinks-detail', 'post:drinks'])
+        self.assertAllows(required, ['get:drinks-detail', '*:drinks'])
+        self.assertDenies(required, ['get:drinks-detail'])
+        self.assertAllows(all_of('get:drinks-detail', 'post:drinks'), required)
+
+    def test_any_of(self):
+        required = any_of('patch:drinks', 'post:drinks')
+        self.assertAllows(required, ['post:drinks'])
+        self.assertDenies(required, ['get:drinks-detail'])
+        self.assertAllows([required, 'get:drinks-detail'], ['patch:drinks', 'get:drinks-detail'])
+
+    def test_compiled_once(self):
+        permission = Permission('patch:drinks')
+        self.assertIs(compile_permission(permission), permission)
+
+    def test_invalid_permission(self):
+        with self.assertRaises(ValueError):
+            compile_permission(42)
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """The LRU cache of the verified tokens"""
+
+    def test_cached_until_exp(self):
+        cache = TokenCache()
+        cache.set('fresh', 'payload', time.time() + 60)
+        cache.set('expired', 'payload', time.time() - 1)
+
+        self.assertEqual(cache.get('fresh'), 'payload')
+        self.assertIsNone(cache.get('expired'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1})
+
+    def test_cached_for_ttl_without_exp(self):
+        cache = TokenCache(ttl=0)
+        cache.set('token', 'payload')
+
+        self.assertIsNone(cache.get('token'))
+
+    def test_least_recently_used_evicted(self):
+        cache = TokenCache(size=2)
+        cache.set('first', 1)
+        cache.set('second', 2)
+        cache.get('first')
+        cache.set('third', 3)
+
+        self.assertEqual(cache.get('first'), 1)
+        self.assertIsNone(cache.get('second'))
+        self.assertEqual(cache.get('third'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_disabled_with_size_zero(self):
+        cache = TokenCache(size=0)
+        cache.set('token', 'payload')
+
+        self.assertIsNone(cache.get('token'))
+
+
+def secret_key(kid):
+    return {'kty': 'oct', 'kid': kid, 'alg': 'HS256', 'use': 'sig',
+            'k': base64.urlsafe_b64encode(kid.encode() * 4).decode().rstrip('=')}
+
+
+class FakeJWKS(JWKSKeyProvider):
+    """A key provider whose key set is `kids`, counting the fetches"""
+
+    def __init__(self, kids, delay=0, **kwargs):
+        kwargs.setdefault('background', False)
+        super().__init__('https://example.test/.well-known/jwks.json', **kwargs)
+        self.kids = list(kids)
+        self.delay = delay
+        self.error = None
+        self.reads = 0
+        self.reads_lock = threading.Lock()
+
+    def read_jwks(self):
+        with self.reads_lock:
+            self.reads += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'keys': [secret_key(kid) for kid in self.kids]}
+
+    def age(self, seconds):
+        # as if the key set was fetched `seconds` earlier
+        self.fetched_at -= seconds
+
+
+class JWKSKeyProviderTestCase(unittest.TestCase):
+    """Fetches of the key set: on first use, unknown kids, expiry and rotation"""
+
+    def test_fetched_once(self):
+        keys = FakeJWKS(['a', 'b'])
+
+        self.assertIsNotNone(keys.get_key('a'))
+        self.assertIsNotNone(keys.get_key('b'))
+        self.assertIs(keys.get_key('a'), keys.get_key('a'))
+        self.assertEqual(keys.reads, 1)
+
+    def test_unknown_kid_refetched(self):
+        keys = FakeJWKS(['a'], min_refetch_interval=0)
+        keys.get_key('a')
+
+        self.assertIsNone(keys.get_key('unknown'))
+        self.assertEqual(keys.reads, 2)
+
+    def test_unknown_kid_refetch_throttled(self):
+        keys = FakeJWKS(['a'], min_refetch_interval=30)
+        keys.get_key('a')
+        for _ in range(5):
+            self.assertIsNone(keys.get_key('unknown'))
+        self.assertEqual(keys.reads, 1)
+
+        keys.age(31)
+        keys.get_key('unknown')
+        self.assertEqual(keys.reads, 2)
+
+    def test_rotated_key(self):
+        keys = FakeJWKS(['old'], min_refetch_interval=30)
+        old = keys.get_key('old')
+        keys.kids = ['new']
+
+        # rotated within min_refetch_interval of the last fetch
+        self.assertIsNone(keys.get_key('new'))
+        keys.age(31)
+        self.assertIsNotNone(keys.get_key('new'))
+        self.assertIsNone(keys.get_key('old'))
+        self.assertIsNot(old, keys.get_key('new'))
+        self.assertEqual(keys.reads, 2)
+
+    def test_keys_expire_without_background_refresh(self):
+        keys = FakeJWKS(['a'], ttl=60)
+        keys.get_key('a')
+        keys.age(30)
+        keys.get_key('a')
+        self.assertEqual(keys.reads, 1)
+
+        keys.age(31)
+        keys.get_key('a')
+        self.assertEqual(keys.reads, 2)
+
+    def test_failed_fetch_keeps_keys(self):
+        keys = FakeJWKS(['a'], min_refetch_interval=0)
+        key = keys.get_key('a')
+        keys.error = URLError('unreachable')
+
+        with self.assertRaises(URLError):
+            keys.get_key('unknown')
+        self.assertIs(keys.get_key('a'), key)
+
+    def concurrent_get_key(self, keys, kid, threads=8):
+        barrier = threading.Barrier(threads)
+
+        def get_key(_):
+            barrier.wait()
+            return keys.get_key(kid)
+
+        with ThreadPoolExecutor(threads) as executor:
+            return list(executor.map(get_key, range(threads)))
+
+    def test_first_fetch_single_flight(self):
+        keys = FakeJWKS(['a'], delay=0.1)
+        found = self.concurrent_get_key(keys, 'a')
+
+        self.assertEqual(keys.reads, 1)
+        self.assertTrue(all(key is found[0] for key in found))
+
+    def test_unknown_kid_single_flight(self):
+        keys = FakeJWKS(['old'], delay=0.1, min_refetch_interval=0)
+        keys.get_key('old')
+        keys.kids = ['old', 'new']
+        found = self.concurrent_get_key(keys, 'new')
+
+        # one refetch for all the threads that missed at the same time
+        self.assertEqual(keys.reads, 2)
+        self.assertTrue(all(key is not None for key in found))
+
+
+class AuthTestCase(unittest.TestCase):
+    """Tokens of a local issuer, verified against its key set in a local JWKS file"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.issuer = LocalIssuer(generate_private_key())
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'jwks.json')
+        with open(path, 'w') as file:
+            json.dump(cls.issuer.jwks(), file)
+        cls.jwks_url = 'file://' + path
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.token_cache = TokenCache()
+        self.auth = Auth(JWKSKeyProvider(self.jwks_url, background=False),
+                         AUDIENCE, self.issuer.issuer, self.token_cache)
+
+    def assertAuthError(self, token, code, status_code):
+        with self.assertRaises(AuthError) as context:
+            self.auth.verify_token(token)
+        self.assertEqual(context.exception.error['code'], code)
+        self.assertEqual(context.exception.status_code, status_code)
+
+    def test_verify_token(self):
+        token = self.issuer.mint(AUDIENCE, ['get:drinks-detail'])
+        payload, grants = self.auth.verify_token(token)
+
+        self.assertEqual(payload['permissions'], ['get:drinks-detail'])
+        self.assertTrue(check_permissions('get:drinks-detail', payload, grants))
+        with self.assertRaises(AuthError) as context:
+            check_permissions('post:drinks', payload, grants)
+        self.assertEqual(context.exception.status_code, 401)
+
+    def test_verified_token_cached(self):
+        token = self.issuer.mint(AUDIENCE, ['get:drinks-detail'])
+        first = self.auth.verify_token(token)
+        second = self.auth.verify_token(token)
+
+        self.assertIs(first[1], second[1])
+        self.assertEqual(self.token_cache.stats()['hits'], 1)
+
+    def test_cached_token_rejected_after_exp(self):
+        token = self.issuer.mint(AUDIENCE, ['get:drinks-detail'], expires_in=1)
+        payload, _ = self.auth.verify_token(token)
+        # jose rejects the tokens whose exp is before the current second
+        time.sleep(max(payload['exp'] + 1 - time.time(), 0) + 0.1)
+
+        self.assertAuthError(token, 'token_expired', 401)
+
+    def test_token_without_permissions(self):
+        now = int(time.time())
+        token = jwt.encode({
+            'iss': self.issuer.issuer, 'sub': 'local-user', 'aud': AUDIENCE,
+            'iat': now, 'exp': now + 60
+        }, self.issuer.private_pem, algorithm='RS256', headers={'kid': self.issuer.kid})
+        payload, grants = self.auth.verify_token(token)
+
+        self.assertIsNone(grants)
+        with self.assertRaises(AuthError) as context:
+            check_permissions('get:drinks-detail', payload, grants)
+        self.assertEqual(context.exception.error['code'], 'invalid_claims')
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_wrong_audience(self):
+        self.assertAuthError(self.issuer.mint('another-api'), 'invalid_claims', 401)
+
+    def test_unknown_signing_key(self):
+        other = LocalIssuer(generate_private_key())
+
+        self.assertAuthError(other.mint(AUDIENCE), 'invalid_header', 400)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
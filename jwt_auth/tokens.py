@@ -0,0 +1,89 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+'''
+TokenCache
+a bounded LRU cache of what was decoded from verified tokens
+    the values are stored under the sha256 digest of their token, until
+    the token expires (its exp claim) or `ttl` seconds, whichever comes
+    first, so a token sent again skips the signature verification.
+    the `size` most recently used tokens are kept
+EXAMPLE
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = verify(token)
+        token_cache.set(token, payload, payload.get('exp'))
+'''
+
+
+class TokenCache:
+    def __init__(self, size=1024, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    '''
+    get(token)
+        returns the cached value of the token, or None
+        when it isn't cached or expired
+    '''
+    def get(self, token):
+        key = self.digest(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    '''
+    set(token, value, exp=None)
+        caches the value decoded from a verified token, that expires at `exp`
+    '''
+    def set(self, token, value, exp=None):
+        if self.size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        key = self.digest(token)
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    '''
+    stats()
+        returns the hit, miss and eviction counters, and the number of cached tokens
+    '''
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries)
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
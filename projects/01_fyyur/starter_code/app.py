@@ -2,25 +2,31 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import io
 import json
+import time as timer
+import click
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, stream_with_context, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
-# to generate random integers when inserting an object to DB
-import random 
+import search
+import importer
+import formatting
+import cache
+from conditional import conditional
 # to trace the last error
 import sys
-# to split genres string by multiple delimeters
-import re
 # to compare dates
-from datetime import datetime
+from datetime import datetime, date, time
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -33,22 +39,53 @@ db = SQLAlchemy(app)
 # TODO: connect to a local postgresql database
 # migrate all the models in 'app' to the database 'db'
 migrate = Migrate(app, db)
+# rendered pages of the listings and detail pages, see cache.py
+page_cache = cache.PageCache(cache.backend_from_config(app.config))
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+# genres are stored once in the Genre table and linked to venues and artists,
+# the (genre_id, venue_id/artist_id) indexes serve the genre filters of the listings
+venue_genres = db.Table('venue_genres',
+  db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+  db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+  db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+  db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id')
+)
+
+class Genre(db.Model):
+  __tablename__ = 'Genre'
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(120), unique=True, nullable=False)
+
+  def __repr__(self):
+    return f'<Genre ID: {self.id}, Name: {self.name}>'
+
 class Show(db.Model):
   __tablename__ = 'Show'
   id = db.Column(db.Integer, primary_key=True)
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
-  venue_name = db.Column(db.String, db.ForeignKey('Venue.name'), unique=True, nullable=False)
-  artist_name = db.Column(db.String, db.ForeignKey('Artist.name'), unique=True, nullable=False)
-  venue_image_link = db.Column(db.String(500), db.ForeignKey('Venue.image_link'), unique=True)
-  artist_image_link = db.Column(db.String(500), db.ForeignKey('Artist.image_link'), unique=True)
   start_time = db.Column(db.DateTime())
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+  # venue and artist names/images are joined in, not copied into the show
+  venue = db.relationship('Venue')
+  artist = db.relationship('Artist')
+
+  # serve the shows of a venue/artist ordered by time from the index
+  __table_args__ = (
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+  )
 
 class Venue(db.Model):
   __tablename__ = 'Venue'
@@ -63,14 +100,15 @@ class Venue(db.Model):
   facebook_link = db.Column(db.String(120))
 
   # TODO: implement any missing fields, as a database migration using Flask-Migrate
-  genres = db.Column(db.String(120))
+  genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name')
   seeking_talent = db.Column(db.Boolean)
   seeking_description = db.Column(db.String(500))
   website = db.Column(db.String(120))
   past_shows = db.relationship('Show', backref='past_venues', primaryjoin="and_(Venue.id==Show.venue_id, Show.start_time < func.current_date())")
-  past_shows_count = db.Column(db.Integer)
+  past_shows_count = db.Column(db.Integer, default=0)
   upcoming_shows = db.relationship('Show', backref='upcoming_venues', primaryjoin="and_(Venue.id==Show.venue_id, Show.start_time >= func.current_date())")
-  upcoming_shows_count = db.Column(db.Integer)
+  upcoming_shows_count = db.Column(db.Integer, default=0)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
   def __repr__(self):
     return f'<Venue ID: {self.id}, \n Name: {self.name}, \n City: {self.city}, \n State: {self.state}, \n Address: {self.address}, \n Phone: {self.phone}, \n Genres: {self.genres} \n ----------------------------->'
@@ -84,7 +122,7 @@ class Artist(db.Model):
   city = db.Column(db.String(120))
   state = db.Column(db.String(120))
   phone = db.Column(db.String(120))
-  genres = db.Column(db.String(120))
+  genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name')
   image_link = db.Column(db.String(500), unique=True)
   facebook_link = db.Column(db.String(120))
 
@@ -93,26 +131,220 @@ class Artist(db.Model):
   seeking_venue = db.Column(db.Boolean)
   seeking_description = db.Column(db.String(500))
   past_shows = db.relationship('Show', backref='past_artists', primaryjoin="and_(Artist.id==Show.artist_id, Show.start_time < func.current_date())")
-  past_shows_count = db.Column(db.Integer)
+  past_shows_count = db.Column(db.Integer, default=0)
   upcoming_shows = db.relationship('Show', backref='upcoming_artists', primaryjoin="and_(Artist.id==Show.artist_id, Show.start_time >= func.current_date())")
-  upcoming_shows_count = db.Column(db.Integer)
+  upcoming_shows_count = db.Column(db.Integer, default=0)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
   def __repr__(self):
     return f'<Artist ID: {self.id}, \n Name: {self.name}, \n City: {self.city}, \n State: {self.state}, \n Phone: {self.phone}, \n Genres: {self.genres} \n ----------------------------->'
 
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# `past_shows_count` and `upcoming_shows_count` of venues and artists are kept up to date
+# when a show is inserted or deleted, so list and search pages can read them
+# without touching the Show table. a show is counted as past or upcoming against the date
+# it's inserted or deleted on, nothing moves it to the past count at midnight: the counts
+# are stale from midnight until `flask reconcile-show-counts` recounts them, it must run
+# daily just after midnight (see the Maintenance section of the README)
+
+def show_count_column(model, start_time):
+  # shows starting today or later are upcoming, same as the `upcoming_shows` relationship
+  if start_time is not None and start_time >= datetime.combine(date.today(), time()):
+    return model.upcoming_shows_count
+  return model.past_shows_count
+
+def add_to_show_counts(connection, show, delta):
+  for model, owner_id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+    column = show_count_column(model, show.start_time)
+    connection.execute(
+      model.__table__.update()
+        .where(model.id == owner_id)
+        .values({column.key: func.coalesce(column, 0) + delta})
+    )
+
+@event.listens_for(Show, 'after_insert')
+def count_show(mapper, connection, show):
+  add_to_show_counts(connection, show, 1)
+
+@event.listens_for(Show, 'after_delete')
+def uncount_show(mapper, connection, show):
+  add_to_show_counts(connection, show, -1)
+
+# recounts the shows of every venue and artist with one UPDATE per table
+def reconcile_show_counts():
+  def count(owner_id, model, criterion):
+    return select([func.count(Show.id)]) \
+      .where(owner_id == model.id) \
+      .where(criterion) \
+      .as_scalar()
+
+  for model, owner_id in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    db.session.execute(
+      model.__table__.update().values({
+        model.past_shows_count.key: count(owner_id, model, Show.start_time < func.current_date()),
+        model.upcoming_shows_count.key: count(owner_id, model, Show.start_time >= func.current_date()),
+      })
+    )
+  db.session.commit()
+  # every venue and artist page is tagged with 'artists'/'venues'
+  page_cache.invalidate('venues', 'artists')
+
+@app.cli.command('reconcile-show-counts')
+def reconcile_show_counts_command():
+  reconcile_show_counts()
+  print('Show counts are reconciled')
+
+# in-process name indexes, used for search when the database has no pg_trgm
+venue_names = search.watch(Venue, search.TrigramIndex())
+artist_names = search.watch(Artist, search.TrigramIndex())
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+# see formatting.py, accepts datetime values as well as strings
+app.jinja_env.filters['datetime'] = formatting.datetime_filter
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# case-insensitive partial name search, best match first, with the number of
+# upcoming shows of every result (read from the show counters). on PostgreSQL it's a single query served by
+# the pg_trgm index, otherwise the in-process index ranks the ids and a single
+# query fetches them
+def search_by_name(model, index, term):
+  query = db.session.query(
+      model.id,
+      model.name,
+      func.coalesce(model.upcoming_shows_count, 0).label('num_upcoming_shows')
+    )
+
+  if db.engine.dialect.name == 'postgresql':
+    return query.filter(model.name.ilike('%{}%'.format(term))) \
+      .order_by(func.similarity(model.name, term).desc(), model.id) \
+      .all()
+
+  if not index.loaded:
+    index.load(db.session.query(model.id, model.name))
+  ids = index.search(term)
+  rank = {id: position for position, id in enumerate(ids)}
+  results = query.filter(model.id.in_(ids)).all() if ids else []
+  return sorted(results, key=lambda result: rank[result.id])
+
+# returns the Genre rows with the given names, creating the ones that don't exist yet
+def get_genres(names):
+  names = set(names)
+  genres = Genre.query.filter(Genre.name.in_(names)).all() if names else []
+  for name in names - {genre.name for genre in genres}:
+    genre = Genre(name=name)
+    db.session.add(genre)
+    genres.append(genre)
+  return genres
+
+# limits a listing query to the venues/artists of the genre with the given name,
+# an indexed join through the association table instead of a string scan
+def filter_by_genre(query, model, genre):
+  if not genre:
+    return query
+  return query.join(model.genres).filter(Genre.name == genre)
+
+# loader options of each view, so a detail page is served by the same small
+# number of queries whatever the number of shows. the past shows (with their
+# artist/venue) are joined to the venue/artist row and the upcoming shows come from a single IN query, joining
+# both collections would multiply past by upcoming rows
+loader_profiles = {
+  'show_venue': (
+    joinedload(Venue.past_shows).joinedload(Show.artist),
+    selectinload(Venue.upcoming_shows).joinedload(Show.artist),
+    selectinload(Venue.genres),
+  ),
+  'show_artist': (
+    joinedload(Artist.past_shows).joinedload(Show.venue),
+    selectinload(Artist.upcoming_shows).joinedload(Show.venue),
+    selectinload(Artist.genres),
+  ),
+  # the edit forms don't show the shows at all
+  'edit_venue': (
+    selectinload(Venue.genres),
+  ),
+  'edit_artist': (
+    selectinload(Artist.genres),
+  ),
+}
+
+# loads the `model` row with the given id using the loader profile of `view`
+# (the current endpoint by default), aborts with 404 when it doesn't exist
+def load_for_view(model, id, view=None):
+  options = loader_profiles.get(view or request.endpoint, ())
+  instance = model.query.options(*options).filter(model.id == id).one_or_none()
+  if instance is None:
+    abort(404)
+  return instance
+
+# fingerprint of the pages rendered from `models`, for their ETag. one query reading
+# the row count (which deletes change) and max(updated_at) of every table, served by
+# the updated_at indexes. the date is part of the fingerprint, since shows move from
+# upcoming to past at midnight
+def tables_state(*models):
+  columns = []
+  for model in models:
+    columns.append(select([func.count(model.id)]).as_scalar())
+    columns.append(select([func.max(model.updated_at)]).as_scalar())
+  state = db.session.query(*columns).one()
+  return (date.today(),) + tuple(state)
+
+def listing_state(*models):
+  return lambda **view_args: tables_state(*models)
+
+# keyset (cursor) pagination: returns the PAGE_SIZE rows that come right after
+# `cursor` in the order of `columns`, and the cursor of the next page (None on the last page).
+# unlike OFFSET, the cost of a page doesn't grow with how deep into the listing it is
+def keyset_page(query, columns, cursor=None):
+  page_size = app.config['PAGE_SIZE']
+  if cursor is not None:
+    query = query.filter(tuple_(*columns) > tuple_(*cursor))
+  # fetch one extra row to know whether there is a next page
+  rows = query.order_by(*columns).limit(page_size + 1).all()
+  if len(rows) <= page_size:
+    return rows, None
+  rows = rows[:page_size]
+  return rows, tuple(getattr(rows[-1], column.key) for column in columns)
+
+# shows are paginated by (start_time, id), the cursor is sent as "<start_time>_<id>"
+def parse_show_cursor(after):
+  if after is None:
+    return None
+  try:
+    start_time, id = after.rsplit('_', 1)
+    return (datetime.fromisoformat(start_time), int(id))
+  except ValueError:
+    abort(400)
+
+def format_show_cursor(cursor):
+  if cursor is None:
+    return None
+  start_time, id = cursor
+  return '{}_{}'.format(start_time.isoformat(), id)
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# Rendering.
+#----------------------------------------------------------------------------#
+
+# renders the template chunk by chunk as the response body is sent,
+# so the first bytes go out before the whole page has been rendered.
+# streaming is enabled with the STREAM_TEMPLATES config or a `?stream=1` argument
+def render_listing(template_name, **context):
+  if not (app.config['STREAM_TEMPLATES'] or request.args.get('stream', 0, type=int)):
+    return render_template(template_name, **context)
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  stream = template.stream(context)
+  stream.enable_buffering(5)
+  return Response(stream_with_context(stream))
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -127,54 +359,41 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional(listing_state(Venue))
+@page_cache.cached('venues')
 def venues():
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
-  venues = Venue.query.all()
-  data = []
-
-  for venue in venues:
-    city_found = False
-    if len(data) > 0:
-      for venues_city in data:
-        if venues_city['city'] == venue.city:
-          venues_city['venues'].append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len(venue.upcoming_shows)
-          })
-          city_found = True
-          break
-        else:
-          # continue until we find the venue's city in data list
-          continue
-      # if the loop is done, and we didn't find the venue's city in data list, 
-      # then we'll create and append the venue's city to the data list
-      if not city_found:
-        venues_city = {
-          "city": venue.city,
-          "state": venue.state,
-          "venues": [{
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len(venue.upcoming_shows)
-          }]
-        }
-        data.append(venues_city)
-    else:
-      venues_city = {
-        "city": venue.city,
-        "state": venue.state,
-        "venues": [{
-          "id": venue.id,
-          "name": venue.name,
-          "num_upcoming_shows": len(venue.upcoming_shows)
-        }]
+  after = request.args.get('after', None, type=int)
+  query = db.session.query(
+      Venue.id,
+      Venue.name,
+      Venue.city,
+      Venue.state,
+      func.coalesce(Venue.upcoming_shows_count, 0)
+    )
+  query = filter_by_genre(query, Venue, request.args.get('genre'))
+  venues, next_cursor = keyset_page(query, [Venue.id], (after,) if after is not None else None)
+
+  # group the page's venues by their (city, state) area, a dict lookup per venue
+  # instead of scanning the areas found so far
+  areas = {}
+  for id, name, city, state, num_upcoming_shows in venues:
+    area = areas.get((city, state))
+    if area is None:
+      area = areas[(city, state)] = {
+        "city": city,
+        "state": state,
+        "venues": []
       }
-      data.append(venues_city)
-
+    area['venues'].append({
+      "id": id,
+      "name": name,
+      "num_upcoming_shows": num_upcoming_shows
+    })
+  data = list(areas.values())
 
-  return render_template('pages/venues.html', areas=data);
+  return render_listing('pages/venues.html', areas=data, next_cursor=next_cursor and next_cursor[0])
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
@@ -182,32 +401,31 @@ def search_venues():
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
   search_term=request.form.get('search_term', '')
-  # add %% before and after search term to get all the results that has the search term in their names
-  search = "%{}%".format(search_term)
-  search_query = Venue.query.filter(Venue.name.ilike(search)).all()
+  results = search_by_name(Venue, venue_names, search_term)
   response={
-    "count": len(search_query),
+    "count": len(results),
     "data": []
   }
-  for venue in search_query:
+  for venue in results:
     response['data'].append({
       "id": venue.id,
       "name": venue.name,
-      "num_upcoming_shows": venue.upcoming_shows_count,
+      "num_upcoming_shows": venue.num_upcoming_shows,
     })
   
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@conditional(listing_state(Venue, Show, Artist))
+@page_cache.cached('venue:{venue_id}', 'artists')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  venue = Venue.query.get(venue_id)
-  venue.genres = re.split('{|}|,', venue.genres) # split genres to remove unwanted delimeters e.g."{","}",","
+  venue = load_for_view(Venue, venue_id)
   data={
     "id": venue.id,
     "name": venue.name,
-    "genres": venue.genres,
+    "genres": [genre.name for genre in venue.genres],
     "address": venue.address,
     "city": venue.city,
     "state": venue.state,
@@ -238,7 +456,6 @@ def create_venue_submission():
   # TODO: modify data to be the data object returned from db insertion
   error = False
   try:
-    id = random.randint(0, 9999)
     name = request.form.get("name")
     city = request.form.get("city")
     state = request.form.get("state")
@@ -246,7 +463,7 @@ def create_venue_submission():
     phone = request.form.get("phone")
     image_link = request.form.get("image_link")
     facebook_link = request.form.get("facebook_link")
-    genres = request.form.getlist("genres")
+    genres = get_genres(request.form.getlist("genres"))
     website = request.form.get("website")
 
     if request.form.get("seeking_talent") == 'y':
@@ -257,7 +474,6 @@ def create_venue_submission():
       seeking_description = ''
     
     venue = Venue(
-      id=id, 
       name=name, 
       city=city, 
       state=state, 
@@ -284,6 +500,7 @@ def create_venue_submission():
     flash('Venue ' + request.form['name'] + ' was not listed due to some error!')
   else:
     # on successful db insert, flash success
+    page_cache.invalidate('venues')
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
 
 
@@ -311,6 +528,7 @@ def delete_venue(venue_id):
   if error:
     print('Venue ' + venue.name + ' was not deleted due to some error!')
   else:
+    page_cache.invalidate('venues', 'venue:' + venue_id, 'shows')
     print('Venue ' + venue.name + ' was successfully deleted!')
 
 
@@ -319,9 +537,14 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(listing_state(Artist))
+@page_cache.cached('artists')
 def artists():
   # TODO: replace with real data returned from querying the database
-  artists = Artist.query.all()
+  after = request.args.get('after', None, type=int)
+  query = db.session.query(Artist.id, Artist.name)
+  query = filter_by_genre(query, Artist, request.args.get('genre'))
+  artists, next_cursor = keyset_page(query, [Artist.id], (after,) if after is not None else None)
   data = []
   for artist in artists:
     data.append({
@@ -329,7 +552,7 @@ def artists():
       "name": artist.name
     })
 
-  return render_template('pages/artists.html', artists=data)
+  return render_listing('pages/artists.html', artists=data, next_cursor=next_cursor and next_cursor[0])
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
@@ -337,32 +560,31 @@ def search_artists():
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
   search_term=request.form.get('search_term', '')
-  # add %% before and after search term to get all the results that has the search term in their names
-  search = "%{}%".format(search_term)
-  search_query = Artist.query.filter(Artist.name.ilike(search)).all()
+  results = search_by_name(Artist, artist_names, search_term)
   response={
-    "count": len(search_query),
+    "count": len(results),
     "data": []
   }
-  for artist in search_query:
+  for artist in results:
     response['data'].append({
       "id": artist.id,
       "name": artist.name,
-      "num_upcoming_shows": artist.upcoming_shows_count,
+      "num_upcoming_shows": artist.num_upcoming_shows,
     })
 
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
+@conditional(listing_state(Artist, Show, Venue))
+@page_cache.cached('artist:{artist_id}', 'venues')
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # TODO: replace with real artist data from the artists table, using artist_id
-  artist = Artist.query.get(artist_id)
-  artist.genres = re.split('{|}|,', artist.genres) # split genres to remove unwanted delimeters e.g."{","}",","
+  artist = load_for_view(Artist, artist_id)
   data={
     "id": artist.id,
     "name": artist.name,
-    "genres": artist.genres,
+    "genres": [genre.name for genre in artist.genres],
     "city": artist.city,
     "state": artist.state,
     "phone": artist.phone,
@@ -384,7 +606,7 @@ def show_artist(artist_id):
 def edit_artist(artist_id):
   form = ArtistForm()
   # TODO: populate form with fields from artist with ID <artist_id>
-  artist = Artist.query.get(artist_id)
+  artist = load_for_view(Artist, artist_id)
 
   # since these fields are different, e.g. TextAreaField, BooleanField,etc..., 
   # we need to handle it in a different way
@@ -392,7 +614,7 @@ def edit_artist(artist_id):
   if artist.seeking_venue:
     form.seeking_venue.data = 'y'
   form.seeking_description.data = artist.seeking_description
-  form.genres.data = artist.genres
+  form.genres.data = [genre.name for genre in artist.genres]
 
   data={
     "id": artist.id,
@@ -419,7 +641,9 @@ def edit_artist_submission(artist_id):
     artist.phone = request.form.get("phone")
     artist.image_link = request.form.get("image_link")
     artist.facebook_link = request.form.get("facebook_link")
-    artist.genres = request.form.getlist("genres")
+    artist.genres = get_genres(request.form.getlist("genres"))
+    # changing only the genres doesn't update the row itself
+    artist.updated_at = datetime.utcnow()
     artist.website = request.form.get("website")
 
     if request.form.get("seeking_venue") == 'y':
@@ -442,6 +666,7 @@ def edit_artist_submission(artist_id):
     flash('Artist ' + request.form['name'] + ' was not updated due to some error!')
   else:
     # on successful db insert, flash success
+    page_cache.invalidate('artists', 'artist:{}'.format(artist_id))
     flash('Artist ' + request.form['name'] + ' was successfully updated!')
   return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -449,7 +674,7 @@ def edit_artist_submission(artist_id):
 def edit_venue(venue_id):
   form = VenueForm()
   # TODO: populate form with values from venue with ID <venue_id>
-  venue = Venue.query.get(venue_id)
+  venue = load_for_view(Venue, venue_id)
 
   # since these fields are different, e.g. TextAreaField, BooleanField,etc..., 
   # we need to handle it in a different way
@@ -457,7 +682,7 @@ def edit_venue(venue_id):
   if venue.seeking_talent:
     form.seeking_talent.data = 'y'
   form.seeking_description.data = venue.seeking_description
-  form.genres.data = venue.genres
+  form.genres.data = [genre.name for genre in venue.genres]
 
   data={
     "id": venue.id,
@@ -469,10 +694,6 @@ def edit_venue(venue_id):
     "website": venue.website,
     "facebook_link": venue.facebook_link,
     "image_link": venue.image_link,
-    "past_shows": venue.past_shows,
-    "upcoming_shows": venue.upcoming_shows,
-    "past_shows_count": len(venue.past_shows),
-    "upcoming_shows_count": len(venue.upcoming_shows),
   }
   return render_template('forms/edit_venue.html', form=form, venue=data)
 
@@ -490,7 +711,9 @@ def edit_venue_submission(venue_id):
     venue.phone = request.form.get("phone")
     venue.image_link = request.form.get("image_link")
     venue.facebook_link = request.form.get("facebook_link")
-    venue.genres = request.form.getlist("genres")
+    venue.genres = get_genres(request.form.getlist("genres"))
+    # changing only the genres doesn't update the row itself
+    venue.updated_at = datetime.utcnow()
     venue.website = request.form.get("website")
 
     if request.form.get("seeking_talent") == 'y':
@@ -509,6 +732,7 @@ def edit_venue_submission(venue_id):
   if error:
     flash('Venue ' + request.form['name'] + ' was not updated due to some error!')
   else:
+    page_cache.invalidate('venues', 'venue:{}'.format(venue_id))
     flash('Venue ' + request.form['name'] + ' was successfully updated!')
   return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -527,14 +751,13 @@ def create_artist_submission():
   # TODO: modify data to be the data object returned from db insertion
   error = False
   try:
-    id = random.randint(0, 9999)
     name = request.form.get("name")
     city = request.form.get("city")
     state = request.form.get("state")
     phone = request.form.get("phone")
     image_link = request.form.get("image_link")
     facebook_link = request.form.get("facebook_link")
-    genres = request.form.getlist("genres")
+    genres = get_genres(request.form.getlist("genres"))
     website = request.form.get("website")
 
     if request.form.get("seeking_venue") == 'y':
@@ -545,7 +768,6 @@ def create_artist_submission():
       seeking_description = ''
     
     artist = Artist(
-      id=id, 
       name=name, 
       city=city, 
       state=state, 
@@ -571,6 +793,7 @@ def create_artist_submission():
     flash('Artist ' + request.form['name'] + ' was not listed due to some error!')
   else:
     # on successful db insert, flash success
+    page_cache.invalidate('artists')
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   return render_template('pages/home.html')
 
@@ -579,12 +802,26 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional(listing_state(Show, Venue, Artist))
+@page_cache.cached('shows', 'venues', 'artists')
 def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
+  after = parse_show_cursor(request.args.get('after', None))
+  # a single query projecting the show list columns out of Show, Venue and Artist
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ).join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id)
+  shows, next_cursor = keyset_page(query, [Show.start_time, Show.id], after)
   data=[]
-  shows = Show.query.all()
   for show in shows:
     data.append({
       "venue_id": show.venue_id,
@@ -595,7 +832,7 @@ def shows():
       "start_time": show.start_time
     })
 
-  return render_template('pages/shows.html', shows=data)
+  return render_listing('pages/shows.html', shows=data, next_cursor=format_show_cursor(next_cursor))
 
 @app.route('/shows/create')
 def create_shows():
@@ -610,27 +847,14 @@ def create_show_submission():
   error = False
 
   try:
-    id = random.randint(0, 9999)
     venue_id = request.form.get('venue_id')
     artist_id = request.form.get('artist_id')
-    venue = Venue.query.get(venue_id)
-    artist = Artist.query.get(artist_id)
-
-    venue_name = venue.name
-    artist_name = artist.name
-    venue_image_link = venue.image_link
-    artist_image_link = artist.image_link
     start_time = request.form.get('start_time')
     # convert start_time from string to timestamp
     start_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
     show = Show(
-      id=id,
       venue_id=venue_id,
       artist_id=artist_id,
-      venue_name=venue_name,
-      artist_name=artist_name,
-      venue_image_link=venue_image_link,
-      artist_image_link=artist_image_link,
       start_time = start_time
     )
     db.session.add(show)
@@ -647,10 +871,157 @@ def create_show_submission():
     flash('An error occurred. Show could not be listed.')
   else:
     # on successful db insert, flash success
+    # /venues shows the upcoming shows counters the insert changed
+    page_cache.invalidate(
+      'shows',
+      'venues',
+      'venue:{}'.format(request.form.get('venue_id')),
+      'artist:{}'.format(request.form.get('artist_id'))
+    )
     flash('Show was successfully listed!')
 
   return render_template('pages/home.html')
 
+#  Bulk import
+#  ----------------------------------------------------------------
+
+venue_fields = ('name', 'city', 'state', 'address', 'phone', 'image_link',
+  'facebook_link', 'website', 'seeking_talent', 'seeking_description')
+artist_fields = ('name', 'city', 'state', 'phone', 'image_link',
+  'facebook_link', 'website', 'seeking_venue', 'seeking_description')
+
+# cached pages to drop after an import. imported shows belong to any venue/artist,
+# and every venue/artist page is tagged with 'artists'/'venues'
+import_tags = {
+  'venues': ('venues',),
+  'artists': ('artists',),
+  'shows': ('shows', 'venues', 'artists'),
+}
+
+# inserts the records IMPORT_BATCH_SIZE at a time with insert_batch(batch), one commit
+# per batch, and returns the number of rows imported. when a batch fails, the batches
+# before it stay imported: the failure is raised as an ImportFailed with the number of
+# rows committed, and whatever was committed is still refreshed (`refresh()`, the
+# cached pages of `kind`), as the rows don't go through the ORM events
+def import_batches(kind, records, insert_batch, refresh):
+  count = 0
+  try:
+    for batch in importer.batches(records, app.config['IMPORT_BATCH_SIZE']):
+      insert_batch(batch)
+      db.session.commit()
+      count += len(batch)
+  except (ValueError, KeyError, IntegrityError) as e:
+    db.session.rollback()
+    # e.g. a venue or artist name that already exists
+    message = str(e.orig) if isinstance(e, IntegrityError) else str(e)
+    raise importer.ImportFailed(message, count)
+  finally:
+    if count:
+      refresh()
+      page_cache.invalidate(*import_tags[kind])
+  return count
+
+# inserts venues or artists with one executemany INSERT (plus one for their genres) per batch
+def import_owners(kind, model, fields, association, owner_id, index, records):
+  def insert_batch(batch):
+    rows = []
+    for record in batch:
+      if not record.get('name'):
+        raise ValueError('every record needs a name')
+      row = {field: record.get(field) for field in fields}
+      for flag in ('seeking_talent', 'seeking_venue'):
+        if flag in row:
+          row[flag] = importer.to_bool(row[flag])
+      row['past_shows_count'] = 0
+      row['upcoming_shows_count'] = 0
+      rows.append(row)
+    db.session.execute(model.__table__.insert(), rows)
+
+    genres = {record['name']: set(importer.to_list(record.get('genres'))) for record in batch}
+    names = set().union(*genres.values())
+    if names:
+      genre_ids = {genre.name: genre for genre in get_genres(names)}
+      db.session.flush()
+      ids = dict(db.session.query(model.name, model.id).filter(model.name.in_(genres.keys())))
+      links = [
+        {owner_id: ids[name], 'genre_id': genre_ids[genre].id}
+        for name in genres
+        for genre in genres[name]
+      ]
+      db.session.execute(association.insert(), links)
+
+  def refresh():
+    # rebuild the in-process search index on next use
+    index.loaded = False
+
+  return import_batches(kind, records, insert_batch, refresh)
+
+def import_venues(records):
+  return import_owners('venues', Venue, venue_fields, venue_genres, 'venue_id', venue_names, records)
+
+def import_artists(records):
+  return import_owners('artists', Artist, artist_fields, artist_genres, 'artist_id', artist_names, records)
+
+def import_shows(records):
+  def insert_batch(batch):
+    for record in batch:
+      record['venue_id'] = int(record.get('venue_id') or 0)
+      record['artist_id'] = int(record.get('artist_id') or 0)
+    venue_ids = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_({record['venue_id'] for record in batch}))}
+    artist_ids = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_({record['artist_id'] for record in batch}))}
+    rows = []
+    for record in batch:
+      if record['venue_id'] not in venue_ids or record['artist_id'] not in artist_ids or not record.get('start_time'):
+        raise ValueError('every show needs an existing venue_id and artist_id, and a start_time')
+      rows.append({
+        'venue_id': record['venue_id'],
+        'artist_id': record['artist_id'],
+        'start_time': dateutil.parser.parse(record['start_time']),
+      })
+    db.session.execute(Show.__table__.insert(), rows)
+
+  # the show counters are maintained by ORM events
+  return import_batches('shows', records, insert_batch, reconcile_show_counts)
+
+importers = {
+  'venues': import_venues,
+  'artists': import_artists,
+  'shows': import_shows,
+}
+
+@app.route('/import/<kind>', methods=['POST'])
+def import_data(kind):
+  # the body is read line by line, as JSON lines or as CSV when sent with a text/csv content type
+  if kind not in importers:
+    abort(404)
+  lines = io.TextIOWrapper(request.stream, encoding='utf-8')
+  records = importer.read_records(lines, importer.guess_format(content_type=request.content_type))
+  try:
+    count = importers[kind](records)
+  except importer.ImportFailed as e:
+    return jsonify({
+      "success": False,
+      "message": str(e),
+      "imported": e.committed
+    }), 400
+  return jsonify({
+    "success": True,
+    "imported": count
+  })
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(importers)))
+@click.argument('file', type=click.File('r'))
+@click.option('--format', type=click.Choice(importer.FORMATS), help='defaults to csv for .csv files, jsonl otherwise')
+def import_data_command(kind, file, format):
+  start = timer.perf_counter()
+  try:
+    count = importers[kind](importer.read_records(file, format or importer.guess_format(file.name)))
+  except importer.ImportFailed as e:
+    raise click.ClickException('{} ({} {} were imported)'.format(e, e.committed, kind))
+  elapsed = timer.perf_counter() - start
+  print('Imported {} {} in {:.2f}s ({:.0f} rows/s)'.format(count, kind, elapsed, count / elapsed if elapsed else 0))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,54 @@
+"""Micro-benchmark of the per-row cost of the templates' `datetime` filter.
+
+Run with:
+    python bench_formatting.py [rows]
+"""
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from flask import Flask
+
+import formatting
+
+
+def format_datetime_per_call(value, format='medium'):
+    # the filter as it was: the row's datetime goes through a string,
+    # is parsed back and Babel resolves the pattern and locale every call
+    date = dateutil.parser.parse(value.strftime("%m/%d/%Y, %H:%M:%S"))
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main(rows=1000):
+    start = datetime(2030, 1, 1, 20)
+    # a show list page, with a few shows starting at the same time
+    values = [start + timedelta(hours=i // 4) for i in range(rows)]
+    app = Flask(__name__)
+
+    def per_call():
+        for value in values:
+            format_datetime_per_call(value, 'full')
+
+    def cached():
+        for value in values:
+            formatting.format_datetime(value, 'full')
+
+    def memoized():
+        with app.app_context():
+            for value in values:
+                formatting.datetime_filter(value, 'full')
+
+    assert format_datetime_per_call(values[0], 'full') == formatting.format_datetime(values[0], 'full')
+    for name, page in (('per call', per_call), ('cached pattern/locale', cached), ('request memo', memoized)):
+        best = min(timeit.repeat(page, number=1, repeat=5))
+        print('{:<22} {:8.2f} us/row'.format(name, best / rows * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
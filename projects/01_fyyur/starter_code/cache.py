@@ -0,0 +1,145 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, request, session
+
+
+# ---------------------------------------------------------------------------
+# Rendered page cache.
+# Pages are cached under their path and a set of tags, e.g. 'venues' or
+# 'venue:1'. Every tag has a version stored in the backend, and a cached page
+# is only served while the versions it was rendered with are current, so
+# invalidating a tag is a single write whatever the number of pages behind it,
+# and works the same with an in-process or a shared backend.
+# ---------------------------------------------------------------------------
+
+
+class LRUBackend:
+    # in-process backend, keeps the `size` most recently used entries
+    def __init__(self, size=1024):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedBackend:
+    # backend shared by every process, on top of a client with the
+    # get(key) / set(key, value, ex=seconds) / delete(key) interface of redis-py
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl) if ttl else None)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def backend_from_config(config):
+    if config.get('PAGE_CACHE_BACKEND') == 'redis':
+        # optional dependency, only needed for the shared backend
+        import redis
+        return SharedBackend(redis.Redis.from_url(config['PAGE_CACHE_URL']))
+    return LRUBackend(config.get('PAGE_CACHE_SIZE', 1024))
+
+
+def seconds_until_midnight(now=None):
+    # upcoming shows become past shows at midnight
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+class PageCache:
+    def __init__(self, backend=None):
+        self.backend = backend or LRUBackend()
+
+    def versions(self, tags):
+        # current versions of the tags, a tag that has none yet gets one
+        versions = []
+        for tag in tags:
+            version = self.backend.get('tag:' + tag)
+            if version is None:
+                version = uuid.uuid4().hex
+                self.backend.set('tag:' + tag, version)
+            versions.append(version)
+        return tuple(versions)
+
+    def get(self, key, versions):
+        entry = self.backend.get('page:' + key)
+        if entry is None or entry[0] != versions:
+            return None
+        return entry[1]
+
+    def set(self, key, versions, value, ttl=None):
+        # `versions` are the ones read before rendering `value`, so a page
+        # rendered while one of its tags is invalidated is never served
+        self.backend.set('page:' + key, (versions, value), ttl)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.set('tag:' + tag, uuid.uuid4().hex)
+
+    def clear(self):
+        self.backend.clear()
+
+    def cached(self, *tags):
+        # caches the rendered page of a GET view under `tags`, formatted with
+        # the view arguments (e.g. 'venue:{venue_id}'), until midnight or
+        # PAGE_CACHE_TTL seconds, whichever comes first
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                # streamed pages, and pages that would show flashed messages, are not cached
+                if not current_app.config['PAGE_CACHE_ENABLED'] \
+                        or request.args.get('stream') \
+                        or session.get('_flashes'):
+                    return f(*args, **kwargs)
+
+                versions = self.versions([tag.format(**kwargs) for tag in tags])
+                key = request.full_path
+                page = self.get(key, versions)
+                if page is None:
+                    page = f(*args, **kwargs)
+                    if not isinstance(page, str):
+                        return page
+                    ttl = min(current_app.config['PAGE_CACHE_TTL'], seconds_until_midnight())
+                    self.set(key, versions, page, ttl)
+                return page
+            return wrapper
+        return decorator
@@ -0,0 +1,33 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+
+# ---------------------------------------------------------------------------
+# Conditional GET for the venue, artist and show pages.
+# The ETag of a page hashes its URL and the state of the tables it lists
+# (see tables_state in app.py), so a browser that already has the current
+# page gets a 304 before the page is queried or rendered.
+# ---------------------------------------------------------------------------
+
+
+def conditional(state):
+    # `state(**view_args)` returns the fingerprint of the page,
+    # which changes whenever the page would
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # pages that would show flashed messages differ from the cached copies
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return f(*args, **kwargs)
+            fingerprint = (request.full_path, state(**kwargs))
+            etag = hashlib.sha1(repr(fingerprint).encode('utf-8')).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
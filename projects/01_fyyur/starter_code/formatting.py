@@ -0,0 +1,49 @@
+from datetime import datetime
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+from flask import g, has_app_context
+
+
+# ---------------------------------------------------------------------------
+# Date formatting for the templates' `datetime` filter.
+# The filter runs once per show row, so the Babel pattern and Locale are
+# compiled once and reused, datetime values are formatted without going
+# through a string, and a timestamp repeated within a request is formatted once.
+# ---------------------------------------------------------------------------
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def get_locale(identifier):
+    return Locale.parse(identifier)
+
+
+@lru_cache(maxsize=64)
+def get_pattern(format):
+    return parse_pattern(FORMATS.get(format, format))
+
+
+def format_datetime(value, format='medium', locale='en'):
+    # `value` is a datetime, or a string that is parsed first
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    return get_pattern(format).apply(value, get_locale(locale))
+
+
+def datetime_filter(value, format='medium', locale='en'):
+    # memoizes the formatted values for the duration of the request
+    if not has_app_context():
+        return format_datetime(value, format, locale)
+    memo = g.setdefault('formatted_datetimes', {})
+    key = (value, format, locale)
+    formatted = memo.get(key)
+    if formatted is None:
+        formatted = memo[key] = format_datetime(value, format, locale)
+    return formatted
@@ -0,0 +1,70 @@
+import csv
+import json
+from itertools import islice
+
+
+# ---------------------------------------------------------------------------
+# Readers for the bulk import of venues, artists and shows.
+# Records are read lazily one line at a time, so an import file of any size
+# is held in memory one batch at a time.
+# ---------------------------------------------------------------------------
+
+FORMATS = ('jsonl', 'csv')
+
+
+class ImportFailed(Exception):
+    # a bulk import that failed after `committed` rows were imported
+    def __init__(self, message, committed):
+        super().__init__(message)
+        self.committed = committed
+
+
+def guess_format(filename=None, content_type=None):
+    if (filename or '').lower().endswith('.csv') or 'csv' in (content_type or ''):
+        return 'csv'
+    return 'jsonl'
+
+
+def read_records(lines, format='jsonl'):
+    # yields one dict per JSON line or CSV row (the first CSV row names the fields)
+    if format == 'csv':
+        for row in csv.DictReader(lines):
+            yield {field: value for field, value in row.items() if value not in (None, '')}
+    elif format == 'jsonl':
+        for number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError('line {} is not valid JSON'.format(number))
+            if not isinstance(record, dict):
+                raise ValueError('line {} is not a JSON object'.format(number))
+            yield record
+    else:
+        raise ValueError('unknown import format: {}'.format(format))
+
+
+def batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('y', 'yes', 'true', '1')
+    return bool(value)
+
+
+def to_list(value):
+    # genres are a JSON list, or a ';' separated string in CSV files
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(';') if item.strip()]
+    return list(value)
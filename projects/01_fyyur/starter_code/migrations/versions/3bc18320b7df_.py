@@ -0,0 +1,43 @@
+"""drop the copied venue/artist columns of Show, index shows by owner and time
+
+Revision ID: 3bc18320b7df
+Revises: 8a71aa5c31c8
+Create Date: 2026-10-18 12:20:55.840173
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3bc18320b7df'
+down_revision = '8a71aa5c31c8'
+branch_labels = None
+depends_on = None
+
+
+copied_columns = ('venue_name', 'artist_name', 'venue_image_link', 'artist_image_link')
+
+
+def upgrade():
+    # dropping the columns also drops their unique and foreign key constraints
+    with op.batch_alter_table('Show') as batch_op:
+        for column in copied_columns:
+            batch_op.drop_column(column)
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('venue_name', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('artist_name', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('venue_image_link', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('artist_image_link', sa.String(length=500), nullable=True))
+    for owner in ('Venue', 'Artist'):
+        op.execute(
+            'UPDATE "Show" SET {0}_name = (SELECT name FROM "{1}" WHERE "{1}".id = "Show".{0}_id), '
+            '{0}_image_link = (SELECT image_link FROM "{1}" WHERE "{1}".id = "Show".{0}_id)'
+            .format(owner.lower(), owner))
@@ -0,0 +1,37 @@
+"""generate Venue, Artist and Show ids from sequences
+
+Revision ID: 8a71aa5c31c8
+Revises: 8addb6df3e09
+Create Date: 2026-10-18 11:42:09.317266
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a71aa5c31c8'
+down_revision = '8addb6df3e09'
+branch_labels = None
+depends_on = None
+
+
+tables = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    # ids used to be picked with random.randint(0, 9999), so the sequences behind
+    # the id columns (if any) are behind the rows already in the tables.
+    # SQLite assigns INTEGER PRIMARY KEY ids by itself
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in tables:
+        sequence = '"{}_id_seq"'.format(table)
+        op.execute('CREATE SEQUENCE IF NOT EXISTS {} OWNED BY "{}".id'.format(sequence, table))
+        op.execute('ALTER TABLE "{}" ALTER COLUMN id SET DEFAULT nextval(\'{}\')'.format(table, sequence))
+        op.execute('SELECT setval(\'{0}\', COALESCE((SELECT MAX(id) FROM "{1}"), 0) + 1, false)'.format(sequence, table))
+
+
+def downgrade():
+    # the sequences are kept, they were most likely created with the tables
+    pass
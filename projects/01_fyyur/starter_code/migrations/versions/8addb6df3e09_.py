@@ -0,0 +1,113 @@
+"""move venue and artist genres to a Genre table
+
+Revision ID: 8addb6df3e09
+Revises: dde6678b30d0
+Create Date: 2026-10-18 11:03:47.582914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8addb6df3e09'
+down_revision = 'dde6678b30d0'
+branch_labels = None
+depends_on = None
+
+
+# (owner table, association table, owner id column)
+owners = (
+    ('Venue', 'venue_genres', 'venue_id'),
+    ('Artist', 'artist_genres', 'artist_id'),
+)
+
+
+def parse_genres(genres):
+    # genres were stored as a Postgres array literal, where multi-word genres are
+    # quoted and " and \ escaped with a backslash: '{Jazz,"Rock n Roll"}'
+    genres = (genres or '').strip()
+    if genres.startswith('{') and genres.endswith('}'):
+        genres = genres[1:-1]
+    names, name, quoted, escaped = [], '', False, False
+    for char in genres:
+        if escaped:
+            name += char
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            names.append(name)
+            name = ''
+        else:
+            name += char
+    names.append(name)
+    return [name.strip() for name in names if name.strip()]
+
+
+def format_genres(names):
+    # the array literal of parse_genres, every genre quoted
+    return '{' + ','.join(
+        '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"' for name in names) + '}'
+
+
+def upgrade():
+    genre_table = op.create_table('Genre',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    for owner, association, owner_id in owners:
+        op.create_table(association,
+            sa.Column(owner_id, sa.Integer(), nullable=False),
+            sa.Column('genre_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint([owner_id], [owner + '.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint(owner_id, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id'.format(association), association, ['genre_id', owner_id])
+
+    # backfill from the genres strings
+    connection = op.get_bind()
+    rows = {}
+    for owner, association, owner_id in owners:
+        rows[owner] = connection.execute(
+            sa.text('SELECT id, genres FROM "{}"'.format(owner))).fetchall()
+
+    names = sorted({name for owner in rows for id, genres in rows[owner] for name in parse_genres(genres)})
+    if names:
+        op.bulk_insert(genre_table, [{'name': name} for name in names])
+    genre_ids = dict((name, id) for id, name in connection.execute(sa.text('SELECT id, name FROM "Genre"')))
+
+    for owner, association, owner_id in owners:
+        association_table = sa.table(association, sa.column(owner_id), sa.column('genre_id'))
+        links = [
+            {owner_id: id, 'genre_id': genre_ids[name]}
+            for id, genres in rows[owner]
+            for name in set(parse_genres(genres))
+        ]
+        if links:
+            op.bulk_insert(association_table, links)
+        op.drop_column(owner, 'genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    for owner, association, owner_id in owners:
+        op.add_column(owner, sa.Column('genres', sa.String(length=120), nullable=True))
+        genres = {}
+        for id, name in connection.execute(sa.text(
+                'SELECT a.{0}, g.name FROM {1} a JOIN "Genre" g ON g.id = a.genre_id ORDER BY g.name'
+                .format(owner_id, association))):
+            genres.setdefault(id, []).append(name)
+        owner_table = sa.table(owner, sa.column('id'), sa.column('genres'))
+        for id, names in genres.items():
+            connection.execute(owner_table.update()
+                               .where(owner_table.c.id == id)
+                               .values(genres=format_genres(names)))
+        op.drop_index('ix_{}_genre_id'.format(association), table_name=association)
+        op.drop_table(association)
+    op.drop_table('Genre')
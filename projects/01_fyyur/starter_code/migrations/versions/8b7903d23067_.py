@@ -0,0 +1,34 @@
+"""add updated_at to Venue, Artist and Show
+
+Revision ID: 8b7903d23067
+Revises: 3bc18320b7df
+Create Date: 2026-10-18 13:05:12.770418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b7903d23067'
+down_revision = '3bc18320b7df'
+branch_labels = None
+depends_on = None
+
+
+tables = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    # max(updated_at) of each table is part of the fingerprint hashed into the pages' ETags
+    for table in tables:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.func.current_timestamp()))
+        op.create_index('ix_{}_updated_at'.format(table), table, ['updated_at'])
+
+
+def downgrade():
+    for table in tables:
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,35 @@
+"""trigram indexes for venue and artist name search
+
+Revision ID: dde6678b30d0
+Revises: 9d3c91ebd43a
+Create Date: 2026-10-18 10:12:31.104825
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dde6678b30d0'
+down_revision = '9d3c91ebd43a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm GIN indexes serve `name ILIKE '%term%'` and similarity() ranking
+    # without a sequential scan. Other databases use the in-process index in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'],
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'],
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
@@ -0,0 +1,111 @@
+import re
+from collections import defaultdict
+from sqlalchemy import event
+
+
+# ---------------------------------------------------------------------------
+# In-process trigram index.
+# On PostgreSQL, name searches are served by the pg_trgm GIN indexes
+# (see migrations/versions/dde6678b30d0_.py). Databases without pg_trgm,
+# e.g. the SQLite database used in test runs, fall back to this index,
+# which follows the same rules: candidates are the names that contain every
+# trigram of the search term, and results are ranked by trigram similarity.
+# ---------------------------------------------------------------------------
+
+
+def trigrams(text):
+    # contiguous 3-character windows of the lowercased text,
+    # every substring of length >= 3 of a name shares all of its windows
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def word_trigrams(text):
+    # trigrams as pg_trgm builds them for similarity(),
+    # each word is padded with two spaces in front and one at the end
+    grams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        word = '  ' + word + ' '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.loaded = False
+        self._postings = defaultdict(set)
+        self._names = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def load(self, rows):
+        # (re)builds the index from (id, name) rows
+        self._postings.clear()
+        self._names.clear()
+        for id, name in rows:
+            self.add(id, name)
+        self.loaded = True
+
+    def add(self, id, name):
+        self.remove(id)
+        name = name or ''
+        self._names[id] = (name.lower(), word_trigrams(name))
+        for gram in trigrams(name):
+            self._postings[gram].add(id)
+
+    def remove(self, id):
+        entry = self._names.pop(id, None)
+        if entry is None:
+            return
+        for gram in trigrams(entry[0]):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self._postings[gram]
+
+    def search(self, term):
+        # returns the ids of the names containing `term` (case-insensitive),
+        # best match first
+        term = term.lower()
+        grams = trigrams(term)
+        if grams:
+            # start from the rarest trigram so the intersection stays small
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            # terms shorter than a trigram can't use the index
+            candidates = self._names.keys()
+
+        term_grams = word_trigrams(term)
+        ranked = []
+        for id in candidates:
+            name, name_grams = self._names[id]
+            if term in name:
+                ranked.append((-similarity(term_grams, name_grams), id))
+        ranked.sort()
+        return [id for rank, id in ranked]
+
+
+def watch(model, index):
+    # keeps `index` in sync with the `name` column of `model`
+    @event.listens_for(model, 'after_insert')
+    @event.listens_for(model, 'after_update')
+    def index_name(mapper, connection, target):
+        if index.loaded:
+            index.add(target.id, target.name)
+
+    @event.listens_for(model, 'after_delete')
+    def unindex_name(mapper, connection, target):
+        if index.loaded:
+            index.remove(target.id)
+
+    return index
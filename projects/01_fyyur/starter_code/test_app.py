@@ -0,0 +1,460 @@
+import os
+import re
+import unittest
+import importlib.util
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from app import app, db, page_cache, Venue, Artist, Show, Genre, \
+    keyset_page, parse_show_cursor, format_show_cursor, venue_names, artist_names
+from search import TrigramIndex
+import babel.dates
+import dateutil.parser
+import formatting
+
+
+def load_migration(revision):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'migrations', 'versions', revision + '_.py')
+    spec = importlib.util.spec_from_file_location('migration_' + revision, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    # endpoint -> maximum number of queries, whatever the number of shows.
+    # one of them reads the tables' state for the ETag
+    query_budgets = {
+        '/venues': 2,
+        '/artists': 2,
+        '/shows': 2,
+        '/venues/1': 4,
+        '/artists/1': 4,
+        '/venues/1/edit': 2,
+        '/artists/1/edit': 2,
+    }
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client
+        self.statements = []
+        page_cache.clear()
+        # the name indexes are reloaded from the tables of this test
+        venue_names.loaded = artist_names.loaded = False
+
+        with app.app_context():
+            db.create_all()
+            jazz, reggae, folk = Genre(name='Jazz'), Genre(name='Reggae'), Genre(name='Folk')
+            db.session.add_all([
+                Venue(id=1, name='The Musical Hop', genres=[jazz, reggae], image_link='venue-1'),
+                Venue(id=2, name='Park Square Live Music & Coffee', genres=[folk], image_link='venue-2'),
+                Artist(id=1, name='Guns N Petals', genres=[jazz], image_link='artist-1'),
+            ])
+            db.session.commit()
+            now = datetime.now()
+            # more than one show per venue and artist
+            db.session.add_all([
+                Show(venue_id=1, artist_id=1, start_time=now + timedelta(days=id if id % 2 else -id))
+                for id in range(1, 21)
+            ])
+            db.session.commit()
+            event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        """Executed after reach test"""
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+            db.drop_all()
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @contextmanager
+    def assert_max_queries(self, budget, url):
+        self.statements = []
+        yield
+        self.assertLessEqual(
+            len(self.statements), budget,
+            '{} ran {} queries:\n{}'.format(url, len(self.statements), '\n'.join(self.statements)))
+
+    def test_pages_query_budget(self):
+        for url, budget in self.query_budgets.items():
+            with self.assert_max_queries(budget, url):
+                res = self.client().get(url)
+            self.assertEqual(res.status_code, 200)
+
+    def test_cached_page_served_without_page_queries(self):
+        self.client().get('/venues/1')
+        with self.assert_max_queries(1, '/venues/1'):
+            res = self.client().get('/venues/1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'The Musical Hop', res.data)
+
+    def test_edit_venue_invalidates_cached_pages(self):
+        self.client().get('/venues/1')
+        self.client().get('/venues')
+        self.client().post('/venues/1/edit', data={
+            "name": "The Musical Hop Reloaded",
+            "city": "San Francisco",
+            "state": "CA",
+            "genres": ["Jazz"]
+        })
+
+        for url in ('/venues/1', '/venues'):
+            res = self.client().get(url)
+            self.assertIn(b'The Musical Hop Reloaded', res.data)
+
+    def test_new_show_invalidates_cached_venues(self):
+        self.client().get('/venues')
+        self.client().post('/shows/create', data={
+            "venue_id": "2",
+            "artist_id": "1",
+            "start_time": "2030-01-01 20:00:00"
+        })
+        self.statements = []
+        self.client().get('/venues')
+
+        # the state query, and the page's, since the upcoming shows counts changed
+        self.assertGreater(len(self.statements), 1)
+
+    def test_reconcile_show_counts_invalidates_cached_pages(self):
+        for url in ('/venues', '/artists/1'):
+            self.client().get(url)
+        app.test_cli_runner().invoke(args=['reconcile-show-counts'])
+
+        for url in ('/venues', '/artists/1'):
+            self.statements = []
+            self.client().get(url)
+            self.assertGreater(len(self.statements), 1, url)
+
+    def show_counts(self):
+        with app.app_context():
+            return [(model.__name__, owner.id, owner.past_shows_count, owner.upcoming_shows_count)
+                    for model in (Venue, Artist) for owner in model.query.order_by(model.id)]
+
+    def test_new_shows_counted(self):
+        for start_time in (datetime.now() + timedelta(days=3), datetime.now() - timedelta(days=3)):
+            self.client().post('/shows/create', data={
+                "venue_id": "2",
+                "artist_id": "1",
+                "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S')
+            })
+
+        self.assertEqual(self.show_counts(), [
+            ('Venue', 1, 10, 10), ('Venue', 2, 1, 1), ('Artist', 1, 11, 11)])
+
+    def test_deleted_show_uncounted(self):
+        with app.app_context():
+            db.session.delete(Show.query.filter(Show.start_time > datetime.now()).first())
+            db.session.delete(Show.query.filter(Show.start_time < datetime.now()).first())
+            db.session.commit()
+
+        self.assertEqual(self.show_counts(), [
+            ('Venue', 1, 9, 9), ('Venue', 2, 0, 0), ('Artist', 1, 9, 9)])
+
+    def test_reconcile_show_counts_command(self):
+        with app.app_context():
+            # an upcoming show that became a past show, and counts that drifted
+            show = Show(venue_id=2, artist_id=1, start_time=datetime.now() + timedelta(days=1))
+            db.session.add(show)
+            db.session.commit()
+            db.session.execute(Show.__table__.update()
+                               .where(Show.id == show.id)
+                               .values(start_time=datetime.now() - timedelta(days=1)))
+            db.session.execute(Venue.__table__.update().values(past_shows_count=None))
+            db.session.commit()
+
+        res = app.test_cli_runner().invoke(args=['reconcile-show-counts'])
+
+        self.assertEqual(res.exit_code, 0)
+        self.assertIn('Show counts are reconciled', res.output)
+        self.assertEqual(self.show_counts(), [
+            ('Venue', 1, 10, 10), ('Venue', 2, 1, 0), ('Artist', 1, 11, 10)])
+
+    def test_304_venues_not_modified(self):
+        etag = self.client().get('/venues').headers['ETag']
+        with self.assert_max_queries(1, '/venues'):
+            res = self.client().get('/venues', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+    def test_venues_etag_changes_with_new_venue(self):
+        etag = self.client().get('/venues').headers['ETag']
+        self.client().post('/import/venues', data='{"name": "The Dueling Pianos Bar"}')
+        res = self.client().get('/venues', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'The Dueling Pianos Bar', res.data)
+
+    def test_venues_etag_changes_with_deleted_venue(self):
+        etag = self.client().get('/venues').headers['ETag']
+        self.client().delete('/venues/2')
+        res = self.client().get('/venues', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn(b'Park Square Live Music', res.data)
+
+    def test_if_modified_since_not_honored(self):
+        res = self.client().get('/venues', headers={
+            'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('Last-Modified', res.headers)
+
+    def follow_pages(self, url, pattern=r'<div class="tile[^"]*">.*?</div>'):
+        # what matches `pattern` on every page of a listing, following its "Next page" links
+        tiles = []
+        while url is not None:
+            res = self.client().get(url)
+            self.assertEqual(res.status_code, 200, url)
+            html = res.data.decode('utf-8')
+            tiles += re.findall(pattern, html, re.S)
+            link = re.search(r'<a href="([^"]+)">Next page', html)
+            url = link and link.group(1).replace('&amp;', '&')
+        return tiles
+
+    def test_keyset_page_walks_every_row_once(self):
+        app.config['PAGE_SIZE'] = 4
+        self.addCleanup(app.config.update, PAGE_SIZE=50)
+        with app.app_context():
+            # shows starting at the same time straddle a page boundary
+            tie = datetime(2030, 1, 1, 20)
+            db.session.add_all([Show(venue_id=2, artist_id=1, start_time=tie) for _ in range(6)])
+            db.session.commit()
+            query = db.session.query(Show.id, Show.start_time)
+            columns = [Show.start_time, Show.id]
+            expected = query.order_by(*columns).all()
+
+            rows, cursor = keyset_page(query, columns)
+            pages = [rows]
+            while cursor is not None:
+                self.assertEqual(parse_show_cursor(format_show_cursor(cursor)), cursor)
+                rows, cursor = keyset_page(query, columns, cursor)
+                pages.append(rows)
+
+        self.assertEqual([row for page in pages for row in page], expected)
+        self.assertTrue(all(len(page) == 4 for page in pages[:-1]))
+        self.assertEqual(len(pages), 7)
+
+    def test_shows_pages_match_unpaginated_listing(self):
+        expected = self.follow_pages('/shows')
+        app.config['PAGE_SIZE'] = 3
+        self.addCleanup(app.config.update, PAGE_SIZE=50)
+
+        self.assertEqual(len(expected), 20)
+        self.assertEqual(self.follow_pages('/shows'), expected)
+
+    def test_venues_pages_match_unpaginated_listing(self):
+        self.client().post('/import/venues', data='\n'.join(
+            '{{"name": "Venue {}", "city": "Austin", "state": "TX"}}'.format(i) for i in range(7)))
+        venue_links = r'href="/venues/(\d+)"'
+        expected = self.follow_pages('/venues', venue_links)
+        app.config['PAGE_SIZE'] = 2
+        self.addCleanup(app.config.update, PAGE_SIZE=50)
+
+        self.assertEqual(len(expected), 9)
+        self.assertEqual(self.follow_pages('/venues', venue_links), expected)
+
+    def test_400_shows_malformed_cursor(self):
+        for after in ('garbage', '2030-01-01T20:00:00', 'yesterday_1', '2030-01-01T20:00:00_x'):
+            res = self.client().get('/shows', query_string={'after': after})
+            self.assertEqual(res.status_code, 400, after)
+
+    def test_streamed_listing_matches_rendered_listing(self):
+        for url in ('/venues', '/artists', '/shows'):
+            rendered = self.client().get(url)
+            streamed = self.client().get(url + '?stream=1')
+
+            # a streamed body's length isn't known before it is sent
+            self.assertIn('Content-Length', rendered.headers)
+            self.assertNotIn('Content-Length', streamed.headers, url)
+            self.assertEqual(streamed.data, rendered.data, url)
+
+    def test_venue_page_lists_all_shows(self):
+        res = self.client().get('/venues/1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'10 Upcoming Shows', res.data)
+        self.assertIn(b'10 Past Shows', res.data)
+
+    def test_filter_venues_by_genre(self):
+        res = self.client().get('/venues?genre=Folk')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Park Square Live Music', res.data)
+        self.assertNotIn(b'The Musical Hop', res.data)
+
+    def test_genres_migration_parses_multi_word_genres(self):
+        migration = load_migration('8addb6df3e09')
+
+        self.assertEqual(migration.parse_genres('{Jazz,"Rock n Roll",Folk}'),
+                         ['Jazz', 'Rock n Roll', 'Folk'])
+        self.assertEqual(migration.parse_genres('{"Hip-Hop \\"Old School\\""}'),
+                         ['Hip-Hop "Old School"'])
+        self.assertEqual(migration.parse_genres(None), [])
+        names = ['Rock n Roll', 'R&B', 'Country, Western']
+        self.assertEqual(migration.parse_genres(migration.format_genres(names)), names)
+
+    def search_results(self, url, term):
+        html = self.client().post(url, data={'search_term': term}).data.decode('utf-8')
+        return re.findall(r'<h5>(.*?)</h5>', html)
+
+    def test_search_venues_case_insensitive(self):
+        for term in ('hop', 'HOP', 'Musical Hop'):
+            self.assertEqual(self.search_results('/venues/search', term), ['The Musical Hop'], term)
+        self.assertEqual(len(self.search_results('/venues/search', 'MUSIC')), 2)
+
+    def test_search_venues_no_match(self):
+        for term in ('Blues', 'Hop Musical', 'zz'):
+            self.assertEqual(self.search_results('/venues/search', term), [], term)
+
+    def test_search_artists_finds_renamed_artist(self):
+        self.assertEqual(self.search_results('/artists/search', 'petals'), ['Guns N Petals'])
+        self.client().post('/artists/1/edit', data={"name": "The Wild Sax Band", "genres": ["Jazz"]})
+
+        self.assertEqual(self.search_results('/artists/search', 'petals'), [])
+        self.assertEqual(self.search_results('/artists/search', 'sax'), ['The Wild Sax Band'])
+
+    def test_filter_artists_by_unknown_genre(self):
+        res = self.client().get('/artists?genre=Blues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn(b'Guns N Petals', res.data)
+
+    def test_bulk_import_venues(self):
+        lines = '\n'.join(
+            '{{"name": "Imported {0}", "city": "Austin", "state": "TX", "genres": ["Blues"]}}'.format(i)
+            for i in range(25))
+        res = self.client().post('/import/venues', data=lines)
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["imported"], 25)
+        with app.app_context():
+            self.assertEqual(Venue.query.join(Venue.genres).filter(Genre.name == 'Blues').count(), 25)
+
+    def test_400_bulk_import_show_of_unknown_venue(self):
+        res = self.client().post('/import/shows', data='{"venue_id": 1000, "artist_id": 1, "start_time": "2030-01-01"}')
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    def test_400_bulk_import_keeps_committed_batches(self):
+        app.config['IMPORT_BATCH_SIZE'] = 2
+        self.addCleanup(app.config.update, IMPORT_BATCH_SIZE=1000)
+        self.client().post('/venues/search', data={'search_term': 'Riverside'})
+        self.assertNotIn(b'Riverside Hall', self.client().get('/venues').data)
+        # the second batch has the name of an existing venue
+        lines = '\n'.join('{{"name": "{}"}}'.format(name) for name in (
+            'Riverside Hall', 'Riverside Club', 'Riverside Bar', 'The Musical Hop'))
+        res = self.client().post('/import/venues', data=lines)
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["imported"], 2)
+        self.assertIn(b'Riverside Hall', self.client().get('/venues').data)
+        res = self.client().post('/venues/search', data={'search_term': 'Riverside'})
+        self.assertIn(b'Riverside Club', res.data)
+        self.assertNotIn(b'Riverside Bar', res.data)
+
+    def test_400_bulk_import_line_not_an_object(self):
+        res = self.client().post('/import/artists', data='["Guns N Petals"]')
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["imported"], 0)
+
+    def test_404_venue_not_found(self):
+        res = self.client().get('/venues/1000')
+
+        self.assertEqual(res.status_code, 404)
+
+
+class TrigramIndexTestCase(unittest.TestCase):
+    """The in-process name index used for search without pg_trgm"""
+
+    def setUp(self):
+        self.index = TrigramIndex()
+        self.index.load([
+            (1, 'The Musical Hop'),
+            (2, 'Park Square Live Music & Coffee'),
+            (3, 'Hop'),
+            (4, 'ÉCOLE DE MUSIQUE'),
+        ])
+
+    def test_matches_substrings_best_first(self):
+        self.assertEqual(self.index.search('Hop'), [3, 1])
+        self.assertEqual(self.index.search('music'), [1, 2])
+        self.assertEqual(self.index.search('c & c'), [2])
+
+    def test_case_folding(self):
+        for term in ('musical', 'MUSICAL', 'mUsIcAl'):
+            self.assertEqual(self.index.search(term), [1], term)
+        self.assertEqual(self.index.search('école'), [4])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search('jazz'), [])
+        # every trigram of the term is in the name, but not the term itself
+        self.assertEqual(self.index.search('hop musical'), [])
+
+    def test_short_terms_scan_every_name(self):
+        self.assertEqual(sorted(self.index.search('&')), [2])
+        self.assertEqual(sorted(self.index.search('ho')), [1, 3])
+
+    def test_add_and_remove(self):
+        self.index.add(3, 'The Dueling Pianos Bar')
+        self.index.remove(1)
+
+        self.assertEqual(self.index.search('hop'), [])
+        self.assertEqual(self.index.search('pianos'), [3])
+        self.assertEqual(len(self.index), 3)
+
+
+class FormattingTestCase(unittest.TestCase):
+    """The cached `datetime` filter against Babel's format_datetime"""
+
+    values = [
+        '2019-05-21T21:30:00.000Z',
+        '2035-04-01T09:05:00.000Z',
+        '2030-12-31 00:00:00',
+        '2030-01-09 12:00:00',
+        datetime(2031, 2, 3, 23, 59),
+        datetime(2031, 7, 14, 0, 1),
+    ]
+
+    def babel_format(self, value, format, locale='en'):
+        # the filter as it was, one format_datetime call per value
+        if isinstance(value, str):
+            value = dateutil.parser.parse(value)
+        return babel.dates.format_datetime(value, formatting.FORMATS.get(format, format), locale=locale)
+
+    def test_formats_match_babel(self):
+        for format in list(formatting.FORMATS) + ['yyyy-MM-dd HH:mm', 'EEE d MMM']:
+            for locale in ('en', 'fr'):
+                for value in self.values:
+                    self.assertEqual(formatting.format_datetime(value, format, locale),
+                                     self.babel_format(value, format, locale),
+                                     (value, format, locale))
+
+    def test_filter_memoized_per_request(self):
+        with app.test_request_context('/shows'):
+            first = formatting.datetime_filter(self.values[0], 'full')
+            second = formatting.datetime_filter(self.values[0], 'full')
+            self.assertEqual(first, self.babel_format(self.values[0], 'full'))
+            self.assertIs(first, second)
+            self.assertEqual(formatting.datetime_filter(self.values[0]),
+                             self.babel_format(self.values[0], 'medium'))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Benchmark of a `POST /quizzes` turn, picking a question that wasn't asked yet.
+
+Run with:
+    python bench_quiz.py [questions]
+"""
+import sys
+import timeit
+
+from flask import Flask
+
+from models import setup_db, db, Question
+from flaskr.quiz import QuestionPool
+
+
+def play_quiz_scan(category, previous_questions):
+    # the endpoint as it was: every question of the category is loaded and
+    # formatted, then compared against the list of previous questions
+    if category == 0:
+        questions = Question.query.all()
+    else:
+        questions = Question.query.filter_by(category=category)
+    random_question = {}
+    for question in [question.format() for question in questions]:
+        if question["id"] not in previous_questions:
+            random_question = question
+    return random_question
+
+
+def main(rows=100000):
+    app = Flask(__name__)
+    setup_db(app, 'sqlite://')
+    db.session.execute(Question.__table__.insert(), [{
+        'question': 'Question {}'.format(i),
+        'answer': 'Answer {}'.format(i),
+        'category': i % 6 + 1,
+        'difficulty': i % 5 + 1
+    } for i in range(rows)])
+    db.session.commit()
+
+    pool = QuestionPool(Question)
+    # a quiz is 5 questions
+    previous_questions = list(range(1, 5))
+
+    load = timeit.timeit(pool.load, number=1)
+    print('{:<22} {:8.2f} ms'.format('loading ids', load * 1e3))
+    for category in (0, 1):
+        def scan():
+            play_quiz_scan(category, previous_questions)
+
+        def pool_get():
+            pool.get(category, previous_questions)
+
+        def pool_ladder():
+            pool.next_question(category, set(previous_questions), 'ladder')
+
+        for name, turn, number in (('scan', scan, 3), ('id pool', pool_get, 1000),
+                                   ('ladder', pool_ladder, 1000)):
+            best = min(timeit.repeat(turn, number=number, repeat=3)) / number
+            print('{:<22} {:8.3f} ms/turn'.format(
+                '{} (category {})'.format(name, category), best * 1e3))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -1,12 +1,26 @@
 import os
-from flask import Flask, request, abort, jsonify
+import io
+import time
+import click
+import threading
+import itertools
+from flask import Flask, request, abort, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import event, func
 import random
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category, reconcile_question_counts
+from .quiz import QuestionPool
+from .sessions import QuizSessions, store_from_config
+from .search import setup_search, iter_search_results, \
+    count_search_results, search_questions as search_question_bank
+from .conditional import conditional
+from .streaming import stream_format, stream_json, STREAM_BATCH_SIZE
+from . import bank
 
 QUESTIONS_PER_PAGE = 10
+COUNT_CACHE_TTL = 60
 
 
 # a helper method that formats the categories,
@@ -24,18 +38,221 @@ def get_result_categories(categories):
     return result_categories
 
 
-def get_current_category(categories):
+# a helper method that picks a random category out of the
+# dictionary returned by get_result_categories
+
+
+def get_current_category(result_categories):
     result_current_category = {}
-    current_category = categories[random.randrange(0, 6)].format()
-    result_current_category[current_category["id"]] = current_category["type"]
+    if result_categories:
+        category_id = random.choice(list(result_categories))
+        result_current_category[category_id] = result_categories[category_id]
 
     return result_current_category
 
 
+# a helper class that caches the number of rows of a model,
+# the count is dropped whenever a row is inserted or deleted by this process,
+# and expires after `ttl` seconds to pick up the changes made by
+# other processes
+
+
+class CachedCount:
+    def __init__(self, model, ttl=COUNT_CACHE_TTL):
+        self.model = model
+        self.ttl = ttl
+        self.value = None
+        self.expires_at = 0
+        event.listen(model, 'after_insert', self.reset)
+        event.listen(model, 'after_delete', self.reset)
+
+    def get(self):
+        if self.value is None or self.expires_at <= time.time():
+            self.value = db.session.query(func.count(self.model.id)).scalar()
+            self.expires_at = time.time() + self.ttl
+        return self.value
+
+    def reset(self, *args):
+        self.value = None
+
+
+# a helper class that caches the categories as formatted by
+# get_result_categories, and their question counts, read through on first use.
+# every insert, update or delete of a category, or of a question,
+# made by this process bumps the cache's version, and the categories are
+# loaded again once the version they were loaded at is outdated,
+# or after `ttl` seconds, to pick up the changes made by other processes
+
+
+class CategoryCache:
+    def __init__(self, model, ttl=COUNT_CACHE_TTL):
+        self.model = model
+        self.ttl = ttl
+        self.version = 0
+        self.loaded = None
+        self.lock = threading.Lock()
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, self.invalidate)
+            event.listen(Question, name, self.invalidate)
+
+    def load(self):
+        version = self.version
+        categories = self.model.query.order_by(self.model.id).all()
+        question_counts = {category.id: category.question_count
+                           for category in categories}
+        # stored along with the version read before loading, so the
+        # categories are loaded again if one changed in the meantime
+        self.loaded = (version, time.time() + self.ttl,
+                       get_result_categories(categories), question_counts)
+        return self.loaded
+
+    def current(self):
+        loaded = self.loaded
+        if loaded is None or loaded[0] != self.version \
+                or loaded[1] <= time.time():
+            with self.lock:
+                loaded = self.loaded
+                if loaded is None or loaded[0] != self.version \
+                        or loaded[1] <= time.time():
+                    loaded = self.load()
+        return loaded
+
+    def get(self):
+        # the categories, as a dictionary of the category types by id
+        return self.current()[2]
+
+    def question_counts(self):
+        # the number of questions of every category, by category id
+        return self.current()[3]
+
+    def state(self):
+        # the fingerprint of the categories, see conditional()
+        categories, question_counts = self.current()[2:]
+        return tuple(categories.items()) + tuple(question_counts.items())
+
+    def invalidate(self, *args):
+        self.version += 1
+
+
+question_count = CachedCount(Question)
+category_cache = CategoryCache(Category)
+question_pool = QuestionPool(Question, ttl=COUNT_CACHE_TTL)
+
+
+# a helper method that resets the cached counts and ids of the questions,
+# after questions were inserted in bulk, without going through the ORM events
+
+
+def reset_question_caches():
+    question_count.reset()
+    category_cache.invalidate()
+    question_pool.invalidate()
+
+
+# a helper method that returns a page of questions ordered by id,
+# of every category or of the given one (served by ix_questions_category_id),
+# the page is either the `page`th one (LIMIT/OFFSET),
+# or the one that starts right after the question with the id `after` (keyset),
+# returns the formatted questions and the cursor of the next page, if any
+
+
+def paginate_questions(page=1, after=None, category=None):
+    query = Question.query.order_by(Question.id)
+    if category is not None:
+        query = query.filter(Question.category == category)
+    if after is not None:
+        query = query.filter(Question.id > after)
+    else:
+        query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+
+    # one extra row tells whether there is a next page
+    questions = query.limit(QUESTIONS_PER_PAGE + 1).all()
+    next_cursor = None
+    if len(questions) > QUESTIONS_PER_PAGE:
+        questions = questions[:QUESTIONS_PER_PAGE]
+        next_cursor = questions[-1].id
+
+    return [question.format() for question in questions], next_cursor
+
+
+# a helper method that returns the category of the best match of a search,
+# as {id: type}, empty when there is no match
+
+
+def get_match_category(question):
+    categories = category_cache.get()
+    if question is None or question["category"] not in categories:
+        return {}
+    return {question["category"]: categories[question["category"]]}
+
+
+# a helper method that returns the category id of the quiz_category
+# of a quiz request, {"type": ..., "id": ...},
+# aborts with 400 when it isn't such an object
+
+
+def get_quiz_category_id(body):
+    quiz_category = body.get("quiz_category", None)
+    if not isinstance(quiz_category, dict):
+        abort(400)
+    try:
+        return int(quiz_category["id"])
+    except (KeyError, TypeError, ValueError):
+        abort(400)
+
+
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    app.config.from_mapping(
+        # 'memory' keeps the quiz sessions in this process,
+        # 'redis' shares them between the processes serving the API
+        QUIZ_SESSION_BACKEND='memory',
+        QUIZ_SESSION_URL='redis://localhost:6379/0',
+        QUIZ_SESSION_TTL=3600
+    )
+    if test_config is not None:
+        app.config.from_mapping(test_config)
     setup_db(app)
+    setup_search(db.engine)
+    # warm up the category cache, so the first requests don't have to
+    category_cache.load()
+
+    # recounts the questions of every category, needed after
+    # questions are added or removed outside of the API (e.g. with psql)
+    @app.cli.command('reconcile-question-counts')
+    def reconcile_question_counts_command():
+        reconcile_question_counts()
+        category_cache.invalidate()
+        print('Question counts are reconciled')
+
+    @app.cli.command('import-questions')
+    @click.argument('file', type=click.File('r'))
+    @click.option('--format', type=click.Choice(bank.FORMATS),
+                  help='defaults to csv for .csv files, ndjson otherwise')
+    @click.option('--batch-size', default=bank.IMPORT_BATCH_SIZE,
+                  help='questions inserted per commit')
+    def import_questions_command(file, format, batch_size):
+        format = format or bank.guess_format(file.name)
+        records = bank.read_records(file, format)
+        try:
+            count, elapsed = bank.import_questions(records, batch_size)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+        print('Imported {} questions in {:.2f}s ({:.0f} questions/s)'.format(
+            count, elapsed, count / elapsed if elapsed else 0))
+
+    @app.cli.command('export-questions')
+    @click.argument('file', type=click.File('w'), default='-')
+    @click.option('--format', type=click.Choice(bank.FORMATS),
+                  default='ndjson')
+    def export_questions_command(file, format):
+        for chunk in bank.export_questions(format):
+            file.write(chunk)
+
+    quiz_sessions = QuizSessions(store_from_config(app.config),
+                                 question_pool,
+                                 app.config['QUIZ_SESSION_TTL'])
 
     '''
   @TODO: Set up CORS. Allow '*' for origins.
@@ -61,11 +278,14 @@ def create_app(test_config=None):
   '''
 
     @app.route('/categories')
+    @conditional(category_cache)
     def get_categories():
-        categories = Category.query.all()
-        response_data = get_result_categories(categories)
+        response_data = category_cache.get()
 
-        return jsonify({'categories': response_data})
+        return jsonify({
+            'categories': response_data,
+            'question_counts': category_cache.question_counts()
+        })
 
     '''
   @TODO:
@@ -82,25 +302,24 @@ def create_app(test_config=None):
   '''
 
     @app.route('/questions')
+    @conditional(Question, category_cache)
     def get_questions():
-        questions = Question.query.all()
-        categories = Category.query.all()
-        formatted_questions = [question.format() for question in questions]
-
         page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
+        after = request.args.get('after', None, type=int)
+        if page < 1:
+            abort(404)
 
-        result_questions = formatted_questions[start:end]
+        result_questions, next_cursor = paginate_questions(page, after)
         if len(result_questions) == 0:
             abort(404)
 
-        result_categories = get_result_categories(categories)
-        result_current_category = get_current_category(categories)
+        result_categories = category_cache.get()
+        result_current_category = get_current_category(result_categories)
 
         return jsonify({
             'questions': result_questions,
-            'total_questions': len(formatted_questions),
+            'total_questions': question_count.get(),
+            'next_cursor': next_cursor,
             'categories': result_categories,
             'current_category': result_current_category
         })
@@ -156,6 +375,13 @@ def create_app(test_config=None):
                 or difficulty is None:
             abort(400)
 
+        try:
+            category = int(category)
+        except (TypeError, ValueError):
+            abort(422)
+        if category not in category_cache.get():
+            abort(422)
+
         try:
             question = Question(
                 question=question,
@@ -168,6 +394,50 @@ def create_app(test_config=None):
         except():
             abort(400)
 
+    '''
+  Bulk import and export of the question bank, as NDJSON or CSV.
+  The body of an import is streamed into batched inserts,
+  an export is streamed out of the database.
+  '''
+
+    @app.route('/questions/import', methods=['POST'])
+    def import_question_bank():
+        format = request.args.get('format', None) or \
+            bank.guess_format(content_type=request.content_type)
+        if format not in bank.FORMATS:
+            abort(400)
+
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        try:
+            count, elapsed = bank.import_questions(
+                bank.read_records(lines, format))
+        except ValueError as error:
+            db.session.rollback()
+            return jsonify({
+                "success": False,
+                "error": 400,
+                "message": str(error)
+            }), 400
+        finally:
+            reset_question_caches()
+
+        return jsonify({
+            "success": True,
+            "imported": count,
+            "seconds": round(elapsed, 3),
+            "questions_per_second": round(count / elapsed) if elapsed else None
+        }), 201
+
+    @app.route('/questions/export')
+    def export_question_bank():
+        format = request.args.get('format', 'ndjson')
+        if format not in bank.FORMATS:
+            abort(400)
+
+        mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(bank.export_questions(format)),
+                        mimetype=mimetype)
+
     '''
   @TODO:
   Create a POST endpoint to get questions based on a search term.
@@ -181,23 +451,42 @@ def create_app(test_config=None):
 
     @app.route('/questions/search', methods=['POST'])
     def search_questions():
-        search_term = request.json["searchTerm"]
-        # add %% before and after search term,
-        # to get all the results that has the search term in their names
-        search = "%{}%".format(search_term)
-        questions = Question.query \
-            .filter(Question.question.ilike(search)).all()
+        body = request.get_json()
+
+        if body is None or body.get("searchTerm", None) is None:
+            abort(400)
+
+        # every match, streamed best match first
+        format = stream_format()
+        if format is not None:
+            questions = (question.format() for question in iter_search_results(
+                body["searchTerm"], STREAM_BATCH_SIZE))
+            # the best match is read ahead, for the current category
+            best_match = next(questions, None)
+            if best_match is not None:
+                questions = itertools.chain([best_match], questions)
+            return stream_json(
+                format, "questions", questions,
+                totalQuestions=count_search_results(body["searchTerm"]),
+                currentCategory=get_match_category(best_match))
+
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+
+        # ranked full-text search over the questions and their answers
+        questions, total_questions = search_question_bank(
+            body["searchTerm"], page, QUESTIONS_PER_PAGE)
         result_questions = [question.format() for question in questions]
 
         if len(result_questions) == 0:
             abort(404)
 
-        categories = Category.query.all()
-        result_current_category = get_current_category(categories)
+        result_current_category = get_match_category(result_questions[0])
 
         return jsonify({
             "questions": result_questions,
-            "totalQuestions": len(result_questions),
+            "totalQuestions": total_questions,
             "currentCategory": result_current_category
         })
 
@@ -210,21 +499,43 @@ def create_app(test_config=None):
   category to be shown.
   '''
 
-    @app.route('/categories/<category_id>/questions')
+    @app.route('/categories/<int:category_id>/questions')
+    @conditional(Question, category_cache)
     def get_questions_by_category(category_id):
-        category = Category.query\
-          .filter(Category.id == category_id).one_or_none()
+        categories = category_cache.get()
 
-        if category is None:
+        if category_id not in categories:
+            abort(404)
+
+        # every question of the category, streamed
+        format = stream_format()
+        if format is not None:
+            questions = Question.query.filter_by(category=category_id) \
+                .order_by(Question.id) \
+                .execution_options(stream_results=True) \
+                .yield_per(STREAM_BATCH_SIZE)
+            return stream_json(
+                format, "questions",
+                (question.format() for question in questions),
+                totalQuestions=category_cache.question_counts()[category_id],
+                next_cursor=None,
+                currentCategory=categories[category_id])
+
+        page = request.args.get('page', 1, type=int)
+        after = request.args.get('after', None, type=int)
+        if page < 1:
+            abort(404)
+
+        formatted_questions, next_cursor = paginate_questions(
+            page, after, category_id)
+        if len(formatted_questions) == 0 and page > 1:
             abort(404)
 
-        formatted_category = category.format()
-        questions = Question.query.filter_by(category=formatted_category["id"])
-        formatted_questions = [question.format() for question in questions]
         return jsonify({
             "questions": formatted_questions,
-            "totalQuestions": len(formatted_questions),
-            "currentCategory": formatted_category["type"]
+            "totalQuestions": category_cache.question_counts()[category_id],
+            "next_cursor": next_cursor,
+            "currentCategory": categories[category_id]
         })
 
     '''
@@ -243,35 +554,94 @@ def create_app(test_config=None):
     def play_quiz():
         body = request.get_json()
 
-        if body is None:
+        if not isinstance(body, dict):
             abort(400)
 
         previous_questions = body.get("previous_questions", None)
-        quiz_category = body.get("quiz_category", None)
-        questions = []
+        category_id = get_quiz_category_id(body)
+
+        if previous_questions is None:
+            abort(400)
+
+        # question ids, a list of anything else
+        # isn't a list of previous questions
+        try:
+            previous_questions = set(previous_questions)
+        except TypeError:
+            abort(400)
 
-        if quiz_category["id"] == 0:
-            questions = Question.query.all()
+        # a random question of the category that wasn't asked yet,
+        # of the difficulty the quiz mode asks for, fetched by its primary key.
+        # adaptive quizzes send the difficulty of the last question
+        # and whether it was answered correctly
+        try:
+            question = question_pool.next_question(
+                category_id, previous_questions,
+                body.get("mode", "random"),
+                body.get("difficulty", None),
+                body.get("correct", None))
+        except ValueError:
+            abort(400)
+
+        if question is None:
+            return jsonify({
+                "message": "Game Over"
+            })
         else:
-            category = Category.query.get(quiz_category["id"]).format()
-            questions = Question.query.filter_by(category=category["id"])
+            return jsonify({
+                "question": question.format()
+            })
+
+    '''
+  Quiz sessions: the server keeps the questions asked so far,
+  so a turn is a constant-size request instead of
+  the list of every previous question.
+  '''
 
-        formatted_questions = [question.format() for question in questions]
-        random_question = {}
+    @app.route('/quizzes/sessions', methods=['POST'])
+    def start_quiz_session():
+        body = request.get_json()
 
-        for question in formatted_questions:
-            if question["id"] not in previous_questions:
-                random_question = question
+        if not isinstance(body, dict):
+            abort(400)
 
-        if random_question == {}:
+        try:
+            token = quiz_sessions.start(get_quiz_category_id(body),
+                                        body.get("mode", "random"),
+                                        body.get("difficulty", None))
+        except ValueError:
+            abort(400)
+        return jsonify({
+            "session": token
+        }), 201
+
+    @app.route('/quizzes/sessions/<token>/next', methods=['POST'])
+    def play_quiz_session(token):
+        # whether the last question was answered correctly,
+        # for adaptive quizzes
+        body = request.get_json(silent=True) or {}
+        try:
+            question = quiz_sessions.next_question(
+                token, body.get("correct", None))
+        except KeyError:
+            abort(404)
+
+        if question is None:
             return jsonify({
                 "message": "Game Over"
             })
         else:
             return jsonify({
-                "question": random_question
+                "question": question.format()
             })
 
+    @app.route('/quizzes/sessions/<token>', methods=['DELETE'])
+    def end_quiz_session(token):
+        quiz_sessions.end(token)
+        return jsonify({
+            "message": "Quiz session is ended"
+        })
+
     '''
   @TODO:
   Create error handlers for all expected errors
@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from models import db, Question, Category
+
+FORMATS = ('ndjson', 'csv')
+FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+
+
+# bulk import and export of the question bank, as NDJSON (one question
+# per line) or CSV (with a header row). both read and write one question
+# at a time, so a bank of any size is held in memory one batch at a time
+
+
+def guess_format(filename=None, content_type=None):
+    if (filename or '').lower().endswith('.csv') \
+            or 'csv' in (content_type or ''):
+        return 'csv'
+    return 'ndjson'
+
+
+def read_records(lines, format='ndjson'):
+    # yields the line number and the dict of every JSON line or CSV row
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                raise ValueError('line {} is not valid JSON'.format(number))
+    else:
+        raise ValueError('unknown format: {}'.format(format))
+
+
+# a helper method that validates a record, returns the columns of its question
+
+
+def to_question(number, record, categories):
+    try:
+        question = {
+            'question': record['question'].strip(),
+            'answer': record['answer'].strip(),
+            'category': int(record['category']),
+            'difficulty': int(record['difficulty'])
+        }
+    except KeyError as error:
+        raise ValueError('line {}: {} is missing'.format(
+            number, error.args[0]))
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError('line {}: invalid question'.format(number))
+
+    if not question['question'] or not question['answer']:
+        raise ValueError(
+            'line {}: question and answer are required'.format(number))
+    if question['category'] not in categories:
+        raise ValueError('line {}: unknown category {}'.format(
+            number, question['category']))
+    if not 1 <= question['difficulty'] <= 5:
+        raise ValueError(
+            'line {}: difficulty must be between 1 and 5'.format(number))
+    return question
+
+
+def import_questions(records, batch_size=IMPORT_BATCH_SIZE):
+    # inserts the questions of `records` with one multi-row INSERT and one
+    # commit per batch, and adds them to the question counts of their
+    # categories in the same transaction.
+    # returns the number of imported questions and the time it took,
+    # raises ValueError on the first invalid record, the batches before it
+    # stay imported
+    start = time.perf_counter()
+    categories = {category_id
+                  for category_id, in db.session.query(Category.id)}
+    records = iter(records)
+    imported = 0
+    while True:
+        try:
+            questions = [to_question(number, record, categories)
+                         for number, record in islice(records, batch_size)]
+        except ValueError as error:
+            raise ValueError(
+                '{} ({} questions were imported before it)'.format(
+                    error, imported))
+        if not questions:
+            break
+
+        db.session.execute(Question.__table__.insert(), questions)
+        counts = {}
+        for question in questions:
+            category_id = question['category']
+            counts[category_id] = counts.get(category_id, 0) + 1
+        for category_id, count in counts.items():
+            db.session.execute(
+                Category.__table__.update()
+                .where(Category.id == category_id)
+                .values(question_count=Category.question_count + count))
+        db.session.commit()
+        imported += len(questions)
+
+    return imported, time.perf_counter() - start
+
+
+def export_questions(format='ndjson', batch_size=EXPORT_BATCH_SIZE):
+    # yields the questions ordered by id, one NDJSON line or CSV row at a time.
+    # the rows are fetched `batch_size` at a time from a server-side cursor
+    # (on Postgres), so memory use doesn't depend on the number of questions
+    if format not in FORMATS:
+        raise ValueError('unknown format: {}'.format(format))
+
+    rows = db.session.query(*[getattr(Question, field) for field in FIELDS]) \
+        .order_by(Question.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(batch_size)
+
+    if format == 'ndjson':
+        for row in rows:
+            yield json.dumps(dict(zip(FIELDS, row))) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,53 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, make_response, request
+from sqlalchemy import func, select
+
+from models import db
+from .streaming import stream_format
+
+
+# a helper method that returns the fingerprint of the given models' tables:
+# every table's row count and max(updated_at), read with a single query
+
+
+def get_tables_state(*models):
+    columns = []
+    for model in models:
+        columns.append(select([func.count(model.id)]).as_scalar())
+        columns.append(select([func.max(model.updated_at)]).as_scalar())
+    return tuple(db.session.query(*columns).one())
+
+
+# a decorator that answers a GET request with 304 Not Modified when its
+# If-None-Match has the ETag of the current resource, before the endpoint runs.
+# a source is either a model, whose table state is queried,
+# or a cache with a state() method, such as the category cache.
+# streamed and jsonify'd responses have different ETags, and Vary on Accept
+
+
+def conditional(*sources):
+    models = [source for source in sources if not hasattr(source, 'state')]
+    caches = [source for source in sources if hasattr(source, 'state')]
+
+    def conditional_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            state = get_tables_state(*models) if models else ()
+            for cache in caches:
+                state += cache.state()
+            etag = hashlib.sha1(repr(
+                (request.full_path, stream_format()) + state
+            ).encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            return response
+
+        return wrapper
+    return conditional_decorator
@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+
+from sqlalchemy import event
+
+from models import db
+
+# the quiz category id the frontend sends for "All"
+ALL_CATEGORIES = 0
+# random picks tried before falling back to a scan of the remaining ids
+MAX_ATTEMPTS = 8
+
+DIFFICULTIES = (1, 2, 3, 4, 5)
+# random: any difficulty
+# fixed: only questions of the given difficulty
+# ladder: starts with the easiest questions and climbs a level
+# every LADDER_STEP questions
+# adaptive: one level up after a correct answer, one down after a wrong one
+MODES = ('random', 'fixed', 'ladder', 'adaptive')
+LADDER_STEP = 2
+ADAPTIVE_START = 3
+
+
+# a helper method that returns the difficulty of the next question of a
+# quiz played in `mode`, None for any difficulty.
+# `turn` is the number of questions asked so far, `difficulty` the given
+# difficulty (fixed) or the one of the last question (adaptive),
+# and `correct` whether the last question was answered correctly
+
+
+def target_difficulty(mode, turn, difficulty=None, correct=None):
+    if mode == 'fixed':
+        if difficulty not in DIFFICULTIES:
+            raise ValueError('fixed quizzes need a difficulty between 1 and 5')
+        return difficulty
+    if mode == 'ladder':
+        return min(DIFFICULTIES[0] + turn // LADDER_STEP, DIFFICULTIES[-1])
+    if mode == 'adaptive':
+        if difficulty is None:
+            return ADAPTIVE_START
+        if difficulty not in DIFFICULTIES:
+            raise ValueError('difficulty must be between 1 and 5')
+        if correct is not None:
+            difficulty += 1 if correct else -1
+        return min(max(difficulty, DIFFICULTIES[0]), DIFFICULTIES[-1])
+    if mode == 'random':
+        return None
+    raise ValueError('unknown quiz mode: {}'.format(mode))
+
+
+# a helper class that holds the ids of the questions of every category,
+# so a quiz question is picked without loading the questions.
+# the ids of a category are kept in a list, for picking a random one in O(1),
+# along with the position of every id in that list, for removing one in O(1)
+
+
+class QuestionIds:
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, question_id):
+        return question_id in self.positions
+
+    def add(self, question_id):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def remove(self, question_id):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        # the last id takes the place of the removed one
+        last = self.ids.pop()
+        if last != question_id:
+            self.ids[position] = last
+            self.positions[last] = position
+
+    def sample(self, exclude):
+        # returns a random id that is not in `exclude`, or None.
+        # `exclude` is any container with a length, e.g. a set
+        if len(self.ids) > len(exclude):
+            # some ids are left, most likely found at random
+            for _ in range(MAX_ATTEMPTS):
+                question_id = random.choice(self.ids)
+                if question_id not in exclude:
+                    return question_id
+        # most of the ids are excluded, picking one at random could take long.
+        # when they are all excluded the list holds at most len(exclude) ids,
+        # so the scan is as short as the quiz
+        remaining = [i for i in self.ids if i not in exclude]
+        return random.choice(remaining) if remaining else None
+
+
+# a helper class that picks random quiz questions out of in-memory
+# per category, and per category and difficulty, lists of question ids.
+# the lists are loaded on first use, kept up to date with the questions
+# inserted and deleted by this process, and reloaded every `ttl` seconds
+# to pick up the changes made by other processes
+
+
+class QuestionPool:
+    def __init__(self, model, ttl=60):
+        self.model = model
+        self.ttl = ttl
+        self.categories = None
+        self.levels = None
+        self.expires_at = 0
+        self.lock = threading.Lock()
+        event.listen(model, 'after_insert', self.on_insert)
+        event.listen(model, 'after_delete', self.on_delete)
+
+    def load(self):
+        categories = {ALL_CATEGORIES: QuestionIds()}
+        levels = {}
+        rows = db.session.query(
+            self.model.id, self.model.category, self.model.difficulty)
+        for question_id, category, difficulty in rows:
+            add_question(categories, levels, question_id, category, difficulty)
+
+        with self.lock:
+            self.categories = categories
+            self.levels = levels
+            self.expires_at = time.time() + self.ttl
+
+    def add(self, question_id, category, difficulty):
+        with self.lock:
+            if self.categories is None:
+                return
+            add_question(self.categories, self.levels,
+                         question_id, category, difficulty)
+
+    def remove(self, question_id):
+        with self.lock:
+            if self.categories is None:
+                return
+            for ids in self.categories.values():
+                ids.remove(question_id)
+            for ids in self.levels.values():
+                ids.remove(question_id)
+
+    def invalidate(self):
+        # reloads the ids on next use, after questions were changed in bulk
+        self.expires_at = 0
+
+    def on_insert(self, mapper, connection, question):
+        self.add(question.id, question.category, question.difficulty)
+
+    def on_delete(self, mapper, connection, question):
+        self.remove(question.id)
+
+    def sample(self, category, exclude=(), difficulty=None):
+        # returns the id of a random question of `category`, and of
+        # `difficulty` if given, that is not in `exclude`,
+        # or None when there is none left
+        if self.categories is None or self.expires_at <= time.time():
+            self.load()
+
+        with self.lock:
+            if difficulty is None:
+                ids = self.categories.get(int(category))
+            else:
+                ids = self.levels.get((int(category), difficulty))
+            if ids is None:
+                return None
+            return ids.sample(exclude)
+
+    def get(self, category, exclude=(), difficulty=None):
+        # returns a random question of `category`, and of `difficulty`
+        # if given, that is not in `exclude`,
+        # the only query made is the question's primary key lookup
+        if isinstance(exclude, (list, tuple)):
+            exclude = set(exclude)
+        while True:
+            question_id = self.sample(category, exclude, difficulty)
+            if question_id is None:
+                return None
+            question = self.model.query.get(question_id)
+            if question is not None:
+                return question
+            # deleted by another process since the ids were loaded
+            self.remove(question_id)
+
+    def get_nearest(self, category, exclude=(), difficulty=None):
+        # same as get(), but falls back to the nearest difficulty
+        # that has questions left when `difficulty` has none
+        if difficulty is None:
+            return self.get(category, exclude)
+        if isinstance(exclude, (list, tuple)):
+            exclude = set(exclude)
+        levels = sorted(DIFFICULTIES,
+                        key=lambda level: (abs(level - difficulty), level))
+        for level in levels:
+            question = self.get(category, exclude, level)
+            if question is not None:
+                return question
+        return None
+
+    def next_question(self, category, exclude, mode='random',
+                      difficulty=None, correct=None):
+        # returns the next question of a quiz played in `mode`,
+        # see target_difficulty()
+        target = target_difficulty(mode, len(exclude), difficulty, correct)
+        if mode == 'fixed':
+            return self.get(category, exclude, target)
+        return self.get_nearest(category, exclude, target)
+
+
+# a helper method that adds a question to the lists of its category,
+# of every category, and of their difficulty
+
+
+def add_question(categories, levels, question_id, category, difficulty):
+    keys = [ALL_CATEGORIES] if category is None else [ALL_CATEGORIES, category]
+    for key in keys:
+        categories.setdefault(key, QuestionIds()).add(question_id)
+        if difficulty is not None:
+            level = levels.setdefault((key, difficulty), QuestionIds())
+            level.add(question_id)
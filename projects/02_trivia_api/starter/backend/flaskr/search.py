@@ -0,0 +1,143 @@
+from sqlalchemy import func, text
+
+from models import db, Question
+
+SEARCH_CONFIG = 'english'
+
+
+# full-text search over the questions and their answers.
+# on Postgres the questions are matched against the GIN index
+# ix_questions_search (see trivia.psql) and ranked with ts_rank,
+# on SQLite (used for local development) against an FTS5 table
+# kept up to date by triggers, and ranked with bm25
+
+
+# a helper method that returns the tsvector the GIN index is built on,
+# the expression must stay the same as the index's for the index to be used
+
+
+def question_vector():
+    return func.to_tsvector(
+        SEARCH_CONFIG,
+        func.coalesce(Question.question, '') + ' ' +
+        func.coalesce(Question.answer, ''))
+
+
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE questions_fts USING fts5("
+    "question, answer, content='questions', content_rowid='id', "
+    "tokenize='porter')",
+    "CREATE TRIGGER questions_fts_insert AFTER INSERT ON questions BEGIN "
+    "INSERT INTO questions_fts(rowid, question, answer) "
+    "VALUES (new.id, new.question, new.answer); END",
+    "CREATE TRIGGER questions_fts_delete AFTER DELETE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); END",
+    "CREATE TRIGGER questions_fts_update AFTER UPDATE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "INSERT INTO questions_fts(rowid, question, answer) "
+    "VALUES (new.id, new.question, new.answer); END",
+    "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')"
+]
+
+
+# a helper method that creates the SQLite FTS5 table of the questions,
+# if it doesn't exist yet, and indexes the existing questions
+
+
+def setup_search(engine):
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as connection:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'questions_fts'"
+        )).first()
+        if exists is None:
+            for statement in FTS_SCHEMA:
+                connection.execute(text(statement))
+
+
+# a helper method that turns the search term into an FTS5 query
+# matching every word of it, like Postgres' plainto_tsquery
+
+
+def fts_query(search_term):
+    words = search_term.split()
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+# helper methods that return the Postgres query of the questions matching
+# the search term, best matches first, and the SQLite one of their ids
+
+
+def ranked_questions(search_term):
+    vector = question_vector()
+    query = func.plainto_tsquery(SEARCH_CONFIG, search_term)
+    return Question.query.filter(vector.op('@@')(query)), \
+        (func.ts_rank(vector, query).desc(), Question.id)
+
+
+RANKED_IDS = "SELECT rowid FROM questions_fts " \
+    "WHERE questions_fts MATCH :term ORDER BY bm25(questions_fts), rowid"
+
+
+def fetch_in_order(ids):
+    questions = {question.id: question for question in
+                 Question.query.filter(Question.id.in_(ids))} if ids else {}
+    return [questions[i] for i in ids if i in questions]
+
+
+def count_search_results(search_term):
+    # returns the number of questions matching the search term
+    if db.engine.dialect.name == 'postgresql':
+        return ranked_questions(search_term)[0].count()
+
+    term = fts_query(search_term)
+    if not term:
+        return 0
+    return db.session.execute(text(
+        "SELECT count(*) FROM questions_fts WHERE questions_fts MATCH :term"),
+        {'term': term}).scalar()
+
+
+def search_questions(search_term, page, per_page):
+    # returns the `page`th page of the questions matching the search term,
+    # best matches first, and the total number of matches
+    offset = (page - 1) * per_page
+
+    if db.engine.dialect.name == 'postgresql':
+        matches, ranking = ranked_questions(search_term)
+        total = matches.count()
+        questions = matches.order_by(*ranking) \
+            .offset(offset).limit(per_page).all()
+        return questions, total
+
+    term = fts_query(search_term)
+    if not term:
+        return [], 0
+    total = count_search_results(search_term)
+    ids = [row[0] for row in db.session.execute(
+        text(RANKED_IDS + " LIMIT :limit OFFSET :offset"),
+        {'term': term, 'limit': per_page, 'offset': offset})]
+    return fetch_in_order(ids), total
+
+
+def iter_search_results(search_term, batch_size):
+    # yields every question matching the search term, best matches first,
+    # fetched `batch_size` at a time
+    if db.engine.dialect.name == 'postgresql':
+        matches, ranking = ranked_questions(search_term)
+        yield from matches.order_by(*ranking) \
+            .execution_options(stream_results=True).yield_per(batch_size)
+        return
+
+    term = fts_query(search_term)
+    if not term:
+        return
+    result = db.session.execute(text(RANKED_IDS), {'term': term})
+    while True:
+        ids = [row[0] for row in result.fetchmany(batch_size)]
+        if not ids:
+            return
+        yield from fetch_in_order(ids)
@@ -0,0 +1,161 @@
+import pickle
+import secrets
+import threading
+import time
+
+from .quiz import target_difficulty
+
+
+# a helper class that stores values for `ttl` seconds in this process,
+# the expired values are dropped when read, and swept every `ttl` seconds.
+# lock(key) returns a lock held while a value is read, changed and written
+# back, one of LOCK_STRIPES locks shared by the keys of the same hash
+
+LOCK_STRIPES = 64
+
+
+class MemoryStore:
+    def __init__(self):
+        self.values = {}
+        self.next_sweep = 0
+        self.lock = threading.Lock()
+        self.key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def lock_key(self, key):
+        return self.key_locks[hash(key) % LOCK_STRIPES]
+
+    def get(self, key):
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            self.values[key] = (value, now + ttl)
+            if self.next_sweep <= now:
+                self.values = {k: entry for k, entry in self.values.items()
+                               if entry[1] > now}
+                self.next_sweep = now + ttl
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+
+
+# a helper class that stores values shared by every process, on top of a
+# client with the get(key) / set(key, value, ex=seconds) / delete(key) /
+# lock(name, timeout=seconds) interface of redis-py, the client takes care
+# of the expiration, and lock_key(key) returns a lock shared by every process
+
+
+class SharedStore:
+    def __init__(self, client, prefix='trivia:quiz:', lock_timeout=10):
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    def lock_key(self, key):
+        return self.client.lock(self.prefix + key + ':lock',
+                                timeout=self.lock_timeout)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def store_from_config(config):
+    if config.get('QUIZ_SESSION_BACKEND') == 'redis':
+        # optional dependency, only needed for the shared store
+        import redis
+        return SharedStore(redis.Redis.from_url(config['QUIZ_SESSION_URL']))
+    return MemoryStore()
+
+
+# a helper class that holds a set of question ids in one bit per id,
+# a session of 100k questions takes about 12KB whatever the number of turns
+
+
+class Bitmap:
+    def __init__(self):
+        self.bits = bytearray()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, value):
+        byte = value >> 3
+        return byte < len(self.bits) \
+            and bool(self.bits[byte] & (1 << (value & 7)))
+
+    def add(self, value):
+        if value in self:
+            return
+        byte = value >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (value & 7)
+        self.count += 1
+
+
+# a helper class that keeps the state of the quizzes being played,
+# so a turn only sends the session token instead of every previous question.
+# a session is the quiz category and mode, the difficulty of the last
+# question and the bitmap of the questions asked so far,
+# it expires `ttl` seconds after its last turn
+
+
+class QuizSessions:
+    def __init__(self, store, pool, ttl=3600):
+        self.store = store
+        self.pool = pool
+        self.ttl = ttl
+
+    def start(self, category, mode='random', difficulty=None):
+        # raises ValueError when the mode or difficulty are invalid
+        target_difficulty(mode, 0, difficulty)
+        token = secrets.token_urlsafe(16)
+        self.store.set(token, {
+            'category': int(category),
+            'mode': mode,
+            'difficulty': difficulty,
+            'asked': Bitmap()
+        }, self.ttl)
+        return token
+
+    def next_question(self, token, correct=None):
+        # returns the next question of the session, None when the quiz is over,
+        # raises KeyError when there is no such session.
+        # `correct` tells whether the last question was answered correctly.
+        # the session is read, updated and written back under its lock,
+        # so concurrent turns of a session never pick the same question
+        with self.store.lock_key(token):
+            session = self.store.get(token)
+            if session is None:
+                raise KeyError(token)
+
+            question = self.pool.next_question(
+                session['category'], session['asked'],
+                session['mode'], session['difficulty'], correct)
+            if question is not None:
+                session['asked'].add(question.id)
+                if session['mode'] == 'adaptive':
+                    session['difficulty'] = question.difficulty
+            self.store.set(token, session, self.ttl)
+        return question
+
+    def end(self, token):
+        self.store.delete(token)
@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index, create_engine, event, func, inspect, select
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -25,12 +26,15 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  # serves the questions of a category in id order, for paginating category pages
+  __table_args__ = (Index('ix_questions_category_id', 'category', 'id'),)
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id'))
   difficulty = Column(Integer)
+  updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
   def __init__(self, question, answer, category, difficulty):
     self.question = question
@@ -67,6 +71,9 @@ class Category(db.Model):
 
   id = Column(Integer, primary_key=True)
   type = Column(String)
+  # the number of questions of the category, see count_question()
+  question_count = Column(Integer, nullable=False, default=0, server_default='0')
+  updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
   def __init__(self, type):
     self.type = type
@@ -75,4 +82,45 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+Question counts
+  `question_count` of the categories is kept up to date
+  when a question is inserted, deleted or moved to another category,
+  reconcile_question_counts() recounts it for the changes made outside of the ORM
+'''
+def add_to_question_count(connection, category_id, delta):
+  if category_id is None:
+    return
+  connection.execute(
+    Category.__table__.update()
+      .where(Category.id == category_id)
+      .values(question_count=Category.question_count + delta)
+  )
+
+@event.listens_for(Question, 'after_insert')
+def count_question(mapper, connection, question):
+  add_to_question_count(connection, question.category, 1)
+
+@event.listens_for(Question, 'after_delete')
+def uncount_question(mapper, connection, question):
+  add_to_question_count(connection, question.category, -1)
+
+@event.listens_for(Question, 'after_update')
+def recount_question(mapper, connection, question):
+  history = inspect(question).attrs.category.history
+  if history.has_changes():
+    for category_id in history.deleted:
+      add_to_question_count(connection, category_id, -1)
+    add_to_question_count(connection, question.category, 1)
+
+def reconcile_question_counts():
+  db.session.execute(
+    Category.__table__.update().values(
+      question_count=select([func.count(Question.id)])
+        .where(Question.category == Category.id)
+        .as_scalar()
+    )
+  )
+  db.session.commit()
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 import unittest
 import json
+from concurrent.futures import ThreadPoolExecutor
 from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
@@ -52,6 +53,7 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data["categories"])
+        self.assertEqual(set(data["question_counts"]), set(data["categories"]))
 
     def test_get_all_categories_not_found(self):
         res = self.client().get('/category')
@@ -81,6 +83,17 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["message"], "Not found")
         self.assertEqual(data["success"], False)
 
+    def test_get_questions_after_cursor(self):
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+        res = self.client().get('/questions?after={}'.format(data["next_cursor"]))
+        next_data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(next_data["questions"])
+        self.assertGreater(next_data["questions"][0]["id"], data["questions"][-1]["id"])
+        self.assertEqual(next_data["total_questions"], data["total_questions"])
+
     def test_if_question_not_found(self):
         res = self.client().delete('/questions/1000')
         data = json.loads(res.data)
@@ -97,6 +110,49 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 201)
         self.assertEqual(data["message"], "Question Created")
     
+    def test_create_question_updates_category_count(self):
+        res = self.client().get('/categories')
+        count = json.loads(res.data)["question_counts"]["6"]
+        self.client().post('/questions', json=self.new_question)
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+
+        self.assertEqual(data["question_counts"]["6"], count + 1)
+
+    def test_422_create_question_unknown_category(self):
+        res = self.client().post('/questions', json=dict(self.new_question, category=1000))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data["success"], False)
+
+    def test_import_questions(self):
+        lines = [json.dumps(self.new_question) for i in range(3)]
+        res = self.client().post('/questions/import', data='\n'.join(lines),
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data["imported"], 3)
+
+    def test_400_import_questions_invalid_line(self):
+        res = self.client().post('/questions/import',
+                                 data='question,answer,category,difficulty\nTEST,TEST,6,10\n',
+                                 content_type='text/csv')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+        self.assertIn("line 2", data["message"])
+
+    def test_export_questions(self):
+        res = self.client().get('/questions/export')
+        questions = [json.loads(line) for line in res.data.decode().splitlines()]
+        total_questions = json.loads(self.client().get('/questions').data)["total_questions"]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(questions), total_questions)
+
     def test_400_create_question_bad_request(self):
         res = self.client().post('/questions', json=self.bad_request_question)
         data = json.loads(res.data)
@@ -126,6 +182,32 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data["questions"])
         self.assertTrue(data["totalQuestions"])
     
+    def test_stream_search_question(self):
+        data = json.loads(self.client().post(
+            '/questions/search', json={"searchTerm": "title"}).data)
+        res = self.client().post('/questions/search?stream=1',
+                                 json={"searchTerm": "title"})
+        streamed = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(set(streamed), set(data))
+        self.assertEqual(streamed["totalQuestions"], data["totalQuestions"])
+        self.assertEqual(streamed["currentCategory"], data["currentCategory"])
+
+    def test_search_question_by_answer(self):
+        res = self.client().post('/questions/search', json={"searchTerm": "Maya Angelou"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["questions"][0]["answer"], "Maya Angelou")
+
+    def test_search_result_page_not_found(self):
+        res = self.client().post('/questions/search?page=100', json={"searchTerm": "title"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data["success"], False)
+
     def test_search_result_not_found(self):
         res = self.client().post('/questions/search', json={"searchTerm": "dsgsfgerer"})
         data = json.loads(res.data)
@@ -144,6 +226,34 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data["questions"])
         self.assertTrue(data["totalQuestions"])
 
+    def test_stream_questions_by_category(self):
+        res = self.client().get('/categories/4/questions',
+                                headers={"Accept": "application/x-ndjson"})
+        questions = [json.loads(line) for line in res.data.decode().splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(questions)
+        self.assertTrue(all(question["category"] == 4 for question in questions))
+
+    def test_stream_questions_by_category_keeps_keys(self):
+        data = json.loads(self.client().get('/categories/4/questions').data)
+        res = self.client().get('/categories/4/questions?stream=1')
+        streamed = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(set(streamed), set(data))
+
+    def test_streamed_and_json_responses_have_different_etags(self):
+        res = self.client().get('/categories/4/questions')
+        etag = res.headers["ETag"]
+        streamed = self.client().get(
+            '/categories/4/questions',
+            headers={"Accept": "application/x-ndjson", "If-None-Match": etag})
+
+        self.assertIn("Accept", res.headers["Vary"])
+        self.assertEqual(streamed.status_code, 200)
+        self.assertNotEqual(streamed.headers["ETag"], etag)
+
     def test_404_get_questions_by_invalid_category(self):
         res = self.client().get('/categories/400/questions')
         data = json.loads(res.data)
@@ -166,6 +276,152 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data["question"])
 
+    def test_play_quiz_skips_previous_questions(self):
+        quiz_category = {"type": "History", "id": 4}
+        previous_questions = []
+        while True:
+            res = self.client().post('/quizzes', json={
+                "previous_questions": previous_questions,
+                "quiz_category": quiz_category
+            })
+            data = json.loads(res.data)
+            if "question" not in data:
+                break
+            self.assertNotIn(data["question"]["id"], previous_questions)
+            self.assertEqual(int(data["question"]["category"]), 4)
+            previous_questions.append(data["question"]["id"])
+
+        self.assertEqual(data["message"], "Game Over")
+        self.assertTrue(previous_questions)
+
+    def test_play_quiz_session(self):
+        res = self.client().post('/quizzes/sessions', json={
+            "quiz_category": {"type": "History", "id": 4}
+        })
+        token = json.loads(res.data)["session"]
+        self.assertEqual(res.status_code, 201)
+
+        asked = []
+        while True:
+            res = self.client().post('/quizzes/sessions/{}/next'.format(token))
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            if "question" not in data:
+                break
+            self.assertNotIn(data["question"]["id"], asked)
+            asked.append(data["question"]["id"])
+
+        self.assertEqual(data["message"], "Game Over")
+        self.assertTrue(asked)
+
+    def test_play_quiz_session_concurrent_turns(self):
+        res = self.client().post('/quizzes/sessions', json={
+            "quiz_category": {"type": "All", "id": 0}
+        })
+        token = json.loads(res.data)["session"]
+
+        def play_turns(_):
+            client = self.app.test_client()
+            asked = []
+            for _ in range(5):
+                res = client.post('/quizzes/sessions/{}/next'.format(token))
+                data = json.loads(res.data)
+                if "question" in data:
+                    asked.append(data["question"]["id"])
+            return asked
+
+        with ThreadPoolExecutor(4) as executor:
+            asked = [id for ids in executor.map(play_turns, range(4)) for id in ids]
+
+        self.assertTrue(asked)
+        self.assertEqual(len(asked), len(set(asked)))
+
+    def test_404_play_quiz_unknown_session(self):
+        res = self.client().post('/quizzes/sessions/unknown/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data["success"], False)
+
+    def test_play_quiz_fixed_difficulty(self):
+        res = self.client().post('/quizzes', json={
+            "previous_questions": [],
+            "quiz_category": {"type": "All", "id": 0},
+            "mode": "fixed",
+            "difficulty": 2
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["question"]["difficulty"], 2)
+
+    def test_play_quiz_adaptive_goes_up_after_correct_answer(self):
+        res = self.client().post('/quizzes', json={
+            "previous_questions": [],
+            "quiz_category": {"type": "All", "id": 0},
+            "mode": "adaptive",
+            "difficulty": 1,
+            "correct": True
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["question"]["difficulty"], 2)
+
+    def test_400_play_quiz_unknown_mode(self):
+        res = self.client().post('/quizzes', json={
+            "previous_questions": [],
+            "quiz_category": {"type": "All", "id": 0},
+            "mode": "unknown"
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    def test_400_play_quiz_previous_questions_not_ids(self):
+        res = self.client().post('/quizzes', json={
+            "previous_questions": [[1, 2]],
+            "quiz_category": {"type": "All", "id": 0}
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    def test_400_play_quiz_category_not_an_object(self):
+        for quiz_category in (3, None, "History", {"type": "History"}):
+            res = self.client().post('/quizzes', json={
+                "previous_questions": [],
+                "quiz_category": quiz_category
+            })
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 400, quiz_category)
+            self.assertEqual(data["success"], False)
+
+    def test_400_start_quiz_session_category_not_an_object(self):
+        res = self.client().post('/quizzes/sessions', json={
+            "quiz_category": 3
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    def test_play_quiz_every_question_asked(self):
+        with self.app.app_context():
+            asked = [question.id for question in Question.query.all()]
+        res = self.client().post('/quizzes', json={
+            "previous_questions": asked,
+            "quiz_category": {"type": "All", "id": 0},
+            "mode": "ladder"
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["message"], "Game Over")
+
     def test_play_quiz_bad_request(self):
         res = self.client().post('/quizzes')
         data = json.loads(res.data)
@@ -175,6 +431,40 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["message"], "Bad Request")
         self.assertEqual(data["success"], False)
 
+    def test_get_questions_not_modified(self):
+        res = self.client().get('/questions')
+        etag = res.headers["ETag"]
+        res = self.client().get('/questions', headers={"If-None-Match": etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b"")
+
+    def test_get_questions_modified_after_create(self):
+        res = self.client().get('/questions')
+        etag = res.headers["ETag"]
+        self.client().post('/questions', json=self.new_question)
+        res = self.client().get('/questions', headers={"If-None-Match": etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers["ETag"], etag)
+
+    def test_get_questions_modified_after_delete(self):
+        question = Question(question='q', answer='a', category=1, difficulty=1)
+        question.insert()
+        question_id = question.id
+        etag = self.client().get('/questions').headers["ETag"]
+        self.client().delete('/questions/{}'.format(question_id))
+        res = self.client().get('/questions', headers={"If-None-Match": etag})
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_if_modified_since_not_honored(self):
+        res = self.client().get('/questions', headers={
+            "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("Last-Modified", res.headers)
+
 
 
 
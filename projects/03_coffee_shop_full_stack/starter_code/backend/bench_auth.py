@@ -0,0 +1,230 @@
+"""Benchmark of the auth overhead of `GET /drinks-detail`, `POST /drinks` and
+`PATCH /drinks/<id>`, with tokens minted by a local issuer.
+
+Every endpoint is requested with a fresh token per request (verified every
+time) and with one reused token (verified once, then found in the token
+cache).
+By default the API runs in this process on a scratch database, with the key
+set of a new local issuer, and the auth overhead is the median time of
+verifying a fresh token minus the median time of finding a reused one in the
+cache, both timed around verify_token itself.
+With --url a running API is requested instead, it must trust the key given
+with --key (see the local issuer section of the README), and the overhead is
+the difference of the median latencies, which the noise of the network and
+of the server can make meaningless: an overhead that isn't positive is
+flagged instead of printed, run more --requests.
+
+Run with:
+    python bench_auth.py [--requests 200]
+    python bench_auth.py --url http://127.0.0.1:5000 --key local-issuer.pem [--threads 8]
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+# jwt_auth lives at the root of the repository
+sys.path.insert(0, os.path.abspath(os.path.join(
+    os.path.dirname(__file__), *[os.pardir] * 4)))
+
+from jwt_auth.issuer import LocalIssuer, generate_private_key  # noqa: E402
+
+API_AUDIENCE = 'coffee-shop-api'
+PERMISSIONS = ['get:drinks-detail', 'post:drinks', 'patch:drinks']
+RECIPE = [{'name': 'water', 'color': 'blue', 'parts': 1}]
+# requests sent before the timed ones, so the first requests of a run
+# (connection setup, query plans, imports) aren't measured
+WARMUP_REQUESTS = 20
+
+
+def endpoints(drink_id, run):
+    # (name, method, path, body of a request), the titles are unique
+    titles = itertools.count()
+    return [
+        ('GET /drinks-detail', 'GET', '/drinks-detail', lambda: None),
+        ('POST /drinks', 'POST', '/drinks', lambda: {
+            'title': 'bench {} post {}'.format(run, next(titles)),
+            'recipe': RECIPE}),
+        ('PATCH /drinks/<id>', 'PATCH', '/drinks/{}'.format(drink_id),
+         lambda: {'title': 'bench {} patch {}'.format(run, next(titles)),
+                  'recipe': RECIPE})
+    ]
+
+
+def mint_tokens(issuer, count, run):
+    # a token per request, never sent before, the subject makes them distinct
+    return [issuer.mint(API_AUDIENCE, PERMISSIONS, 'bench-{}-{}'.format(run, i))
+            for i in range(count)]
+
+
+'''
+in-process client, the Flask test client
+'''
+
+
+def local_client(issuer, directory):
+    with open(os.path.join(directory, 'jwks.json'), 'w') as file:
+        json.dump(issuer.jwks(), file)
+    os.environ['JWKS_URL'] = 'file://' + os.path.join(directory, 'jwks.json')
+    os.environ['AUTH_ISSUER'] = issuer.issuer
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+
+    from src import api
+    from src.auth import auth as auth_module
+
+    auth = auth_module.auth
+    verify_token = auth.verify_token
+    timings = []
+
+    def timed_verify_token(token):
+        start = time.perf_counter()
+        try:
+            return verify_token(token)
+        finally:
+            timings.append(time.perf_counter() - start)
+
+    auth.verify_token = timed_verify_token
+    client = api.app.test_client()
+
+    def request(method, path, token, body):
+        response = client.open(path, method=method, json=body, headers={
+            'Authorization': 'Bearer ' + token})
+        return response.status_code, response.get_json()
+
+    return request, timings
+
+
+'''
+http client, for a running API
+'''
+
+
+def http_client(url):
+    def request(method, path, token, body):
+        data = None if body is None else json.dumps(body).encode()
+        http_request = Request(url + path, data=data, method=method, headers={
+            'Authorization': 'Bearer ' + token,
+            'Content-Type': 'application/json'})
+        try:
+            with urlopen(http_request) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as error:
+            return error.code, None
+
+    return request
+
+
+def run(request, endpoint, tokens, threads):
+    name, method, path, body = endpoint
+    latencies = []
+
+    def send(i):
+        start = time.perf_counter()
+        status, _ = request(method, path, tokens[i % len(tokens)], body())
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError('{} returned {}'.format(name, status))
+
+    count = max(len(tokens), 1)
+    start = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(send, range(count)))
+    else:
+        for i in range(count):
+            send(i)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests/s': count / elapsed,
+        'median': statistics.median(latencies),
+        'p95': latencies[max(int(count * 0.95) - 1, 0)]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='coffee shop auth benchmark')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per endpoint and token mode')
+    parser.add_argument('--url', help='a running API, in-process if not given')
+    parser.add_argument('--key', help='private key of the local issuer, '
+                        'a new one if not given (in-process only)')
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.url and not args.key:
+        parser.error('--url requires the --key the API trusts')
+    if args.key:
+        issuer = LocalIssuer.from_file(args.key)
+    else:
+        issuer = LocalIssuer(generate_private_key())
+
+    directory = tempfile.TemporaryDirectory()
+    timings = None
+    if args.url:
+        request = http_client(args.url.rstrip('/'))
+    else:
+        request, timings = local_client(issuer, directory.name)
+
+    reused_token = issuer.mint(API_AUDIENCE, PERMISSIONS)
+    run_id = int(time.time())
+    status, body = request('POST', '/drinks', reused_token, {
+        'title': 'bench {}'.format(run_id), 'recipe': RECIPE})
+    if status != 200:
+        sys.exit('POST /drinks returned {}'.format(status))
+    drink_id = body['drinks'][0]['id']
+
+    print('{:<28} {:>8} {:>10} {:>9} {:>10} {:>16}'.format(
+        '', 'req/s', 'median ms', 'p95 ms', 'verify ms', 'auth overhead'))
+    noisy = []
+    for number, endpoint in enumerate(endpoints(drink_id, run_id)):
+        run(request, endpoint, [reused_token] * WARMUP_REQUESTS, args.threads)
+        results = {}
+        verify = {}
+        fresh_tokens = mint_tokens(
+            issuer, args.requests, '{}-{}'.format(run_id, number))
+        for mode, tokens in (('fresh', fresh_tokens),
+                             ('reused', [reused_token] * args.requests)):
+            if timings is not None:
+                del timings[:]
+            results[mode] = run(request, endpoint, tokens, args.threads)
+            if timings is not None:
+                verify[mode] = statistics.median(timings)
+
+        # the cost of verifying the token of each request, over a cached one
+        fresh = results['fresh']['median']
+        if verify:
+            overhead = verify['fresh'] - verify['reused']
+        else:
+            overhead = fresh - results['reused']['median']
+        if overhead > 0:
+            column = '{:.3f} ms {:.0%}'.format(overhead * 1e3, overhead / fresh)
+        else:
+            column = 'noise, rerun'
+            noisy.append(endpoint[0])
+            print('warning: {} measured no auth overhead ({:.3f} ms), the '
+                  'latencies are too noisy, use more --requests'.format(
+                      endpoint[0], overhead * 1e3), file=sys.stderr)
+        for mode in ('fresh', 'reused'):
+            print('{:<28} {:>8.0f} {:>10.3f} {:>9.3f} {:>10} {:>16}'.format(
+                '{} ({})'.format(endpoint[0], mode),
+                results[mode]['requests/s'], results[mode]['median'] * 1e3,
+                results[mode]['p95'] * 1e3,
+                '{:.3f}'.format(verify[mode] * 1e3) if verify else '-',
+                column if mode == 'fresh' else ''))
+
+    directory.cleanup()
+    if noisy:
+        sys.exit('no auth overhead measured for {}'.format(', '.join(noisy)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the code shared with the other apps of the repository, jwt_auth/ and
+# json_streaming.py, lives at the root of the repository
+sys.path.insert(0, os.path.abspath(os.path.join(
+    os.path.dirname(__file__), *[os.pardir] * 5)))
@@ -1,10 +1,12 @@
 import os
 from flask import Flask, request, jsonify, abort
-from sqlalchemy import exc
+from sqlalchemy import exc, func
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink
+from .conditional import conditional
+from json_streaming import stream_format, stream_json, STREAM_BATCH_SIZE
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
@@ -18,6 +20,32 @@ CORS(app)
 '''
 db_drop_and_create_all()
 
+'''
+drinks_state()
+    the fingerprint of the drinks responses: the number of drinks, which
+    deletes change, and their latest updated_at, which inserts and updates change
+'''
+
+
+def drinks_state():
+    return db.session.query(
+        func.count(Drink.id), func.max(Drink.updated_at)).one()
+
+
+'''
+stream_drinks(format, representation)
+    streams every drink in the given representation (Drink.short or
+    Drink.long), fetching the drinks STREAM_BATCH_SIZE at a time
+'''
+
+
+def stream_drinks(format, representation):
+    drinks = Drink.query.order_by(Drink.id).yield_per(STREAM_BATCH_SIZE)
+    return stream_json(format, "drinks",
+                       (representation(drink) for drink in drinks),
+                       success=True)
+
+
 # ROUTES
 
 
@@ -28,7 +56,12 @@ db_drop_and_create_all()
 
 
 @app.route('/drinks')
+@conditional(drinks_state)
 def get_drinks():
+    format = stream_format()
+    if format is not None:
+        return stream_drinks(format, Drink.short)
+
     drinks = Drink.query.all()
     short_drinks = []
     if len(drinks) > 0:
@@ -48,7 +81,12 @@ def get_drinks():
 
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
+@conditional(drinks_state)
 def get_drinks_detail(jwt):
+    format = stream_format()
+    if format is not None:
+        return stream_drinks(format, Drink.long)
+
     drinks = Drink.query.all()
     long_drinks = []
 
@@ -0,0 +1,34 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from json_streaming import stream_format
+
+
+'''
+@conditional(state)
+    answers GET /drinks and GET /drinks-detail with 304 Not Modified when
+    the client has the current drinks, before they are queried
+    `state()` returns the fingerprint of the drinks (see drinks_state in
+    api.py), the ETag also depends on the url and the streamed format,
+    so the responses Vary on Accept
+'''
+
+
+def conditional(state):
+    def conditional_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            fingerprint = (request.full_path, stream_format()) + tuple(state())
+            etag = hashlib.sha1(repr(fingerprint).encode('utf-8')).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            return response
+
+        return wrapper
+    return conditional_decorator
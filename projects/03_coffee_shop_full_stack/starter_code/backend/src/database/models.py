@@ -1,11 +1,14 @@
 import os
-from sqlalchemy import Column, String, Integer
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+# another database, e.g. a scratch one for the benchmarks
+database_path = os.environ.get("DATABASE_URL", database_path)
 
 db = SQLAlchemy()
 
@@ -49,6 +52,9 @@ class Drink(db.Model):
     # the ingredients blob - this stores a lazy json blob
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
     recipe = Column(String(180), nullable=False)
+    # time of the last insert or update, drinks responses are validated with it
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow,
+                        onupdate=datetime.utcnow, index=True)
 
     '''
     short()